@@ -14,12 +14,40 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
-from .commands import init
-from .commands import build
-from .commands import serve
-from .commands import version
-from .commands import autodoc
-from .commands import clean
-from .commands import __VERSION__
-from .utils import colors
+# Commands are only imported when used, so that running one command doesn't
+# import what the others need
+from .conf import __VERSION__
+
 __version__ = __VERSION__
+
+COMMANDS = [
+    "init",
+    "build",
+    "serve",
+    "version",
+    "autodoc",
+    "clean",
+    "bench",
+    "bench-serve",
+]
+
+
+# Commands needing none of the others' imports
+LIGHT_COMMANDS = ["version", "clean"]
+
+
+def __getattr__(name):
+    if name in LIGHT_COMMANDS:
+        from . import light_commands
+
+        return getattr(light_commands, name)
+    # Commands with a dash are implemented by functions with an underscore
+    if name.replace("_", "-") in COMMANDS:
+        from . import commands
+
+        return getattr(commands, name)
+    if name == "colors":
+        from .utils import colors
+
+        return colors
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
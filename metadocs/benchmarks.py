@@ -0,0 +1,775 @@
+# metadocs: Manage sphinx documentations with mkdocs
+# Copyright (C) 2018  Victor Schmidt vsch[at]pm.me
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import collections
+import datetime
+import http.client
+import json
+import os
+import platform
+import subprocess
+import sys
+import sysconfig
+import threading
+import time
+import urllib.parse
+from html.parser import HTMLParser
+from pathlib import Path
+
+from . import utils
+from .conf import BUILDS_ROUTE, COMPRESSED_SIDECARS, HTML_LOCATION
+
+# The template of the generated projects' configuration
+TEMPLATE_PATH = Path(__file__).resolve().parent / "include" / "example_project"
+
+MODULE_TEMPLATE = '''"""
+Module {index} of package {package}, generated by metadocs bench
+"""
+
+
+def function_{index}(source, value):
+    """Look for a value in a source
+
+    Args:
+        source (str): where to look
+        value (str): what to look for
+
+    Returns:
+        list: occurrences found
+    """
+    return [value] if value in source else []
+
+
+class Model{index}:
+    """A model with a few methods
+
+    Args:
+        name (str): the model's name
+        size (int, optional): Defaults to {index}. The model's size
+    """
+
+    def __init__(self, name, size={index}):
+        self.name = name
+        self.size = size
+
+    def fit(self, data):
+        """Fit the model
+
+        Args:
+            data (list): training data
+
+        Returns:
+            Model{index}: the fitted model
+        """
+        return self
+
+    def predict(self, data):
+        """Predict labels
+
+        Args:
+            data (list): inputs
+
+        Returns:
+            list: one label per input
+        """
+        return [self.size for _ in data]
+'''
+
+PAGE_TEMPLATE = """Page {index}
+{underline}
+
+This page was generated by ``metadocs bench``. It has a few sections,
+lists and code blocks so that building it costs about as much as a
+hand-written page.
+
+Usage
+-----
+
+* Install the project
+* Import :py:mod:`{project}`
+* Call the functions documented in the API reference
+
+.. code-block:: python
+
+    from {project}.package_0 import module_0
+
+    module_0.function_0("source", "value")
+
+Details
+-------
+
+{paragraph}
+"""
+
+PARAGRAPH = (
+    "Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod "
+    "tempor incididunt ut labore et dolore magna aliqua. "
+) * 8
+
+
+# Directory containing this metadocs package, e.g. a checkout
+PACKAGE_ROOT = Path(__file__).resolve().parent.parent
+
+
+def get_cli():
+    """Command running the CLI of this metadocs package, whatever metadocs
+    is first on the PATH: its bin/metadocs in a checkout, the script
+    installed with this interpreter otherwise. Run it with get_cli_env.
+
+    Returns:
+        list(str): the command
+    """
+    script = PACKAGE_ROOT / "bin" / "metadocs"
+    if not script.exists():
+        script = Path(sysconfig.get_path("scripts")) / "metadocs"
+    return [sys.executable, str(script)]
+
+
+def get_cli_env(**variables):
+    """Environment in which get_cli's command imports this metadocs package
+
+    Args:
+        variables (str): other variables to set
+
+    Returns:
+        dict: the environment
+    """
+    python_path = [str(PACKAGE_ROOT)]
+    if os.environ.get("PYTHONPATH"):
+        python_path.append(os.environ["PYTHONPATH"])
+    return dict(os.environ, PYTHONPATH=os.pathsep.join(python_path), **variables)
+
+
+def get_cli_version():
+    """Version of the metadocs package get_cli's command runs
+
+    Returns:
+        str: the version
+    """
+    return subprocess.run(
+        get_cli() + ["version", "--version"],
+        env=get_cli_env(),
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    ).stdout.strip()
+
+
+def run_cli(arguments, cwd, stdin=""):
+    """Run metadocs's CLI and time it
+
+    Args:
+        arguments (list(str)): the CLI's arguments
+        cwd (pathlib.Path): where to run it
+        stdin (str, optional): Defaults to "". Answers to its prompts
+
+    Returns:
+        float: seconds it took
+    """
+    start = time.perf_counter()
+    subprocess.run(
+        get_cli() + arguments,
+        cwd=str(cwd),
+        env=get_cli_env(),
+        input=stdin,
+        universal_newlines=True,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        check=True,
+    )
+    return time.perf_counter() - start
+
+
+def generate_project(dir_path, name, packages, modules, pages):
+    """Generate a sphinx project documenting a generated package, from the
+    example project's configuration
+
+    Args:
+        dir_path (pathlib.Path): the Home Documentation's path
+        name (str): the project's name, and its package's
+        packages (int): number of sub-packages of the package
+        modules (int): number of modules of each sub-package
+        pages (int): number of .rst pages besides the API reference
+    """
+    project_path = dir_path / name
+    source_path = project_path / "source"
+    (source_path / "_static").mkdir(parents=True)
+
+    with open(TEMPLATE_PATH / "source" / "conf.py", "r") as f:
+        conf = f.read()
+    with open(source_path / "conf.py", "w") as f:
+        f.write(conf.replace("An Example Project", name))
+
+    package_path = project_path / name
+    package_path.mkdir()
+    (package_path / "__init__.py").write_text('"""{}, generated"""\n'.format(name))
+    api = []
+    for p in range(packages):
+        package = "{}.package_{}".format(name, p)
+        sub_package_path = package_path / "package_{}".format(p)
+        sub_package_path.mkdir()
+        (sub_package_path / "__init__.py").write_text('"""{}"""\n'.format(package))
+        for m in range(modules):
+            module = "{}.module_{}".format(package, m)
+            (sub_package_path / "module_{}.py".format(m)).write_text(
+                MODULE_TEMPLATE.format(index=m, package=package)
+            )
+            title = "``{}``".format(module)
+            (source_path / "{}.rst".format(module)).write_text(
+                "{}\n{}\n\n.. automodule:: {}\n    :members:\n"
+                "    :undoc-members:\n    :show-inheritance:\n".format(
+                    title, "=" * len(title), module
+                )
+            )
+            api.append(module)
+
+    documents = []
+    for i in range(pages):
+        title = "Page {}".format(i)
+        (source_path / "page_{}.rst".format(i)).write_text(
+            PAGE_TEMPLATE.format(
+                index=i, underline="=" * len(title), project=name, paragraph=PARAGRAPH
+            )
+        )
+        documents.append("page_{}".format(i))
+
+    title = "Welcome to {}'s documentation!".format(name)
+    (source_path / "index.rst").write_text(
+        "{}\n{}\n\n.. toctree::\n   :maxdepth: 2\n\n{}\n".format(
+            title,
+            "=" * len(title),
+            "\n".join("   " + d for d in documents + api),
+        )
+    )
+
+
+def generate_home_documentation(dir_path, projects, packages, modules, pages):
+    """Add generated projects to a Home Documentation and list them in its
+    index.md
+
+    Args:
+        dir_path (pathlib.Path): the Home Documentation's path
+        projects (int): number of projects
+        packages (int): number of sub-packages of each project's package
+        modules (int): number of modules of each sub-package
+        pages (int): number of .rst pages of each project
+
+    Returns:
+        list(str): the projects' names
+    """
+    names = ["project_{}".format(i) for i in range(projects)]
+    index_path = dir_path / utils.get_docs_dir(dir_path) / "index.md"
+    for name in names:
+        generate_project(dir_path, name, packages, modules, pages)
+        utils.add_project_to_doc_index(index_path, name)
+    return names
+
+
+def percentile(values, q):
+    """Nearest-rank percentile
+
+    Args:
+        values (list(float)): the values
+        q (float): the percentile, between 0 and 100
+
+    Returns:
+        float: the percentile, None if there are no values
+    """
+    if not values:
+        return None
+    values = sorted(values)
+    rank = max(0, min(len(values) - 1, int(round(q / 100 * len(values))) - 1))
+    return values[rank]
+
+
+def start_server(dir_path, engine="threaded", options=()):
+    """Start `metadocs serve` on a free port
+
+    Args:
+        dir_path (pathlib.Path): the Home Documentation's path
+        engine (str, optional): Defaults to "threaded". The serve engine
+        options (list(str), optional): Defaults to (). serve's other flags
+
+    Returns:
+        tuple(subprocess.Popen, str): the server's process and its url
+    """
+    process = subprocess.Popen(
+        get_cli()
+        + ["serve", "--port", "0", "--engine", engine, "--access_log", "off"]
+        + list(options),
+        cwd=str(dir_path),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        universal_newlines=True,
+        env=get_cli_env(PYTHONUNBUFFERED="1"),
+    )
+    for line in process.stdout:
+        if line.startswith("Serving at"):
+            port = line.strip().rsplit(":", 1)[1]
+            # Keep reading the server's output so that it never blocks
+            thread = threading.Thread(target=process.stdout.read)
+            thread.daemon = True
+            thread.start()
+            return process, "http://127.0.0.1:{}".format(port)
+    process.wait()
+    raise RuntimeError("metadocs serve exited before serving")
+
+
+def get_builds(url):
+    """Get a running server's builds
+
+    Args:
+        url (str): the server's url
+
+    Returns:
+        dict: queued, running and finished builds, see
+            utils.RebuildScheduler.status
+    """
+    parts = urllib.parse.urlsplit(url)
+    connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=10)
+    try:
+        connection.request("GET", BUILDS_ROUTE)
+        return json.loads(connection.getresponse().read().decode())
+    finally:
+        connection.close()
+
+
+def wait_for_builds(url, since=None, target=None, timeout=300):
+    """Wait for a server's builds to be over, including the rebuilds of
+    what changed before it started
+
+    Args:
+        url (str): the server's url
+        since (float, optional): Defaults to None. With target, wait for
+            a build of the target started after this time
+        target (str, optional): Defaults to None. The target to wait for
+        timeout (float, optional): Defaults to 300. Seconds to wait for
+
+    Returns:
+        dict: the target's finished build, None if not waiting for one
+    """
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        builds = get_builds(url)
+        if target is None:
+            if builds["scanned"] and not builds["queued"] and not builds["running"]:
+                return None
+        else:
+            for build in builds["finished"]:
+                if build["target"] == target and build["started"] >= since:
+                    return build
+        time.sleep(0.01)
+    raise RuntimeError("Builds did not finish in {} seconds".format(timeout))
+
+
+def measure_watch_latency(dir_path, url, project, edits=5):
+    """Time how long a running server takes to rebuild a project after
+    one of its pages is edited: from the edit to the end of the rebuild,
+    so including the watcher's debounce
+
+    Args:
+        dir_path (pathlib.Path): the Home Documentation's path
+        url (str): the server's url
+        project (str): the project to edit
+        edits (int, optional): Defaults to 5. Number of edits
+
+    Returns:
+        list(float): seconds from each edit to the end of its rebuild
+    """
+    page = dir_path / project / "source" / "page_0.rst"
+    latencies = []
+    for i in range(edits):
+        wait_for_builds(url)
+        start = time.time()
+        with open(page, "a") as f:
+            f.write("\nEdit {}.\n".format(i))
+        wait_for_builds(url, since=start, target=project)
+        latencies.append(time.time() - start)
+    return latencies
+
+
+def get_route_prefix(path):
+    """Prefix results are grouped by: the path's first segment, "/" for
+    the Home Documentation's top level files
+
+    Args:
+        path (str): a requested path
+
+    Returns:
+        str: the prefix
+    """
+    segments = path.split("?")[0].strip("/").split("/")
+    if len(segments) < 2:
+        return "/"
+    return "/" + segments[0]
+
+
+def get_served_paths(dir_path):
+    """Paths of the files serve answers for a Home Documentation: its site
+    and each listed project's built html, precompressed copies excluded
+
+    Args:
+        dir_path (pathlib.Path): the Home Documentation's path
+
+    Returns:
+        list(str): the paths, sorted
+    """
+    sidecars = tuple(suffix for _, suffix in COMPRESSED_SIDECARS)
+    roots = [("", dir_path / utils.get_site_dir(dir_path))]
+    for project in utils.get_listed_projects(dir_path):
+        project = project.strip("/")
+        roots.append(("/" + project, dir_path / project / HTML_LOCATION))
+
+    paths = set()
+    for prefix, root in roots:
+        for file_path in root.rglob("*"):
+            if file_path.is_file() and not file_path.name.endswith(sidecars):
+                path = "{}/{}".format(prefix, file_path.relative_to(root).as_posix())
+                if path.endswith("/index.html"):
+                    path = path[: -len("index.html")]
+                paths.add(path)
+    return sorted(paths)
+
+
+class LinkParser(HTMLParser):
+    """Collect the links and resources of an html page
+
+    Args:
+        base (str): the page's path, relative links are resolved against it
+    """
+
+    def __init__(self, base):
+        super().__init__()
+        self.base = base
+        self.links = []
+
+    def handle_starttag(self, tag, attrs):
+        for name, value in attrs:
+            if name in ("href", "src") and value:
+                parts = urllib.parse.urlsplit(urllib.parse.urljoin(self.base, value))
+                if not parts.scheme and not parts.netloc:
+                    self.links.append(parts.path)
+
+
+def crawl(url, start="/", max_paths=1000):
+    """Find a server's paths by following links from a start page
+
+    Args:
+        url (str): the server's url
+        start (str, optional): Defaults to "/". The first page
+        max_paths (int, optional): Defaults to 1000. Stop after finding
+            that many paths
+
+    Returns:
+        list(str): paths answered successfully, sorted
+    """
+    parts = urllib.parse.urlsplit(url)
+    connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=10)
+    seen = {start}
+    queue = collections.deque([start])
+    paths = []
+    try:
+        while queue and len(paths) < max_paths:
+            path = queue.popleft()
+            try:
+                connection.request("GET", path)
+                response = connection.getresponse()
+                body = response.read()
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                continue
+            if response.status >= 400:
+                continue
+            if 300 <= response.status < 400:
+                location = response.getheader("Location")
+                links = [urllib.parse.urljoin(path, location)] if location else []
+            else:
+                paths.append(path)
+                if "html" not in response.getheader("Content-Type", ""):
+                    continue
+                parser = LinkParser(path)
+                parser.feed(body.decode("utf-8", "replace"))
+                links = parser.links
+            for link in links:
+                if link not in seen:
+                    seen.add(link)
+                    queue.append(link)
+    finally:
+        connection.close()
+    return sorted(paths)
+
+
+def replay(url, paths, concurrency=8, duration=5, keep_alive=True):
+    """Request paths from a server as fast as possible
+
+    Args:
+        url (str): the server's url
+        paths (list(str)): paths requested in turn
+        concurrency (int, optional): Defaults to 8. Number of clients
+        duration (float, optional): Defaults to 5. Seconds to run for
+        keep_alive (bool, optional): Defaults to True. Whether each client
+            keeps its connection alive when the server allows it, or opens
+            one connection per request
+
+    Returns:
+        tuple(list, float): (path, status, latency in seconds) of each
+            request, status being None if the request failed, and the
+            seconds it took
+    """
+    parts = urllib.parse.urlsplit(url)
+    headers = {"Accept-Encoding": "gzip, br"}
+    if not keep_alive:
+        headers["Connection"] = "close"
+    samples = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client(offset):
+        connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=10)
+        client_samples = []
+        i = offset
+        while time.perf_counter() < deadline:
+            path = paths[i % len(paths)]
+            start = time.perf_counter()
+            try:
+                connection.request("GET", path, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException):
+                status = None
+                connection.close()
+            if not keep_alive:
+                connection.close()
+            client_samples.append((path, status, time.perf_counter() - start))
+            i += 1
+        connection.close()
+        with lock:
+            samples.extend(client_samples)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, time.perf_counter() - start
+
+
+def summarize(samples, elapsed):
+    """Throughput, latency percentiles and errors of replayed requests
+
+    Args:
+        samples (list): (path, status, latency) of each request
+        elapsed (float): seconds the requests took
+
+    Returns:
+        dict: requests, errors (failed requests and 4xx/5xx answers),
+            error rate, requests per second and latency percentiles in
+            seconds
+    """
+    latencies = [latency for _, _, latency in samples]
+    errors = sum(1 for _, status, _ in samples if status is None or status >= 400)
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "error_rate": errors / len(samples) if samples else 0,
+        "requests_per_second": len(samples) / elapsed if elapsed else 0,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+    }
+
+
+def measure_throughput(url, paths, concurrency=8, duration=5, keep_alive=True):
+    """Replay paths against a server and summarize the requests, overall
+    and by route prefix
+
+    Args:
+        url (str): the server's url
+        paths (list(str)): paths requested in turn
+        concurrency (int, optional): Defaults to 8. Number of clients
+        duration (float, optional): Defaults to 5. Seconds to run for
+        keep_alive (bool, optional): Defaults to True. See replay
+
+    Returns:
+        dict: summarize's result, with a "routes" dict of the summary of
+            each route prefix
+    """
+    samples, elapsed = replay(url, paths, concurrency, duration, keep_alive)
+    routes = collections.defaultdict(list)
+    for sample in samples:
+        routes[get_route_prefix(sample[0])].append(sample)
+
+    results = summarize(samples, elapsed)
+    results["routes"] = {
+        prefix: summarize(route_samples, elapsed)
+        for prefix, route_samples in sorted(routes.items())
+    }
+    return results
+
+
+def format_throughput(results):
+    """Tabulate measure_throughput's results
+
+    Args:
+        results (dict): from measure_throughput
+
+    Returns:
+        str: a line per route prefix and a total
+    """
+    line = "{:<32} {:>9} {:>10} {:>8} {:>8} {:>8} {:>7}"
+    header = ["route", "requests", "req/s", "p50 ms", "p95 ms", "p99 ms", "errors"]
+    lines = [line.format(*header)]
+    rows = list(results["routes"].items()) + [("total", results)]
+    for prefix, route in rows:
+        lines.append(
+            line.format(
+                prefix,
+                route["requests"],
+                "{:.0f}".format(route["requests_per_second"]),
+                "{:.1f}".format((route["p50"] or 0) * 1000),
+                "{:.1f}".format((route["p95"] or 0) * 1000),
+                "{:.1f}".format((route["p99"] or 0) * 1000),
+                "{:.1%}".format(route["error_rate"]),
+            )
+        )
+    return "\n".join(lines)
+
+
+def run_benchmarks(
+    dir_path,
+    projects=5,
+    packages=2,
+    modules=5,
+    pages=10,
+    jobs=None,
+    engine="threaded",
+    edits=5,
+    concurrency=8,
+    duration=5,
+):
+    """Generate a Home Documentation and time metadocs on it: init, a cold
+    and a warm `build -A`, the watcher's edit-to-rebuild latency and serve's
+    throughput
+
+    Args:
+        dir_path (pathlib.Path): an empty directory to work in
+        projects (int, optional): Defaults to 5. Number of generated projects
+        packages (int, optional): Defaults to 2. Number of sub-packages of
+            each project's package
+        modules (int, optional): Defaults to 5. Number of modules of each
+            sub-package
+        pages (int, optional): Defaults to 10. Number of .rst pages of each
+            project
+        jobs (int, optional): Defaults to None. build's -j value, 0 for
+            all CPUs, None to build one project at a time
+        engine (str, optional): Defaults to "threaded". The serve engine
+        edits (int, optional): Defaults to 5. Number of edits timed
+        concurrency (int, optional): Defaults to 8. Number of clients
+            requesting pages from serve
+        duration (float, optional): Defaults to 5. Seconds serve's
+            throughput is measured for
+
+    Returns:
+        dict: the benchmark's parameters, environment and results
+    """
+    results = {}
+    size = {
+        "projects": projects,
+        "packages": packages,
+        "modules": modules,
+        "pages": pages,
+    }
+
+    print("Timing init...")
+    results["init"] = run_cli(["init", "bench_docs"], dir_path, stdin="\n")
+    home_path = dir_path / "bench_docs"
+    names = generate_home_documentation(home_path, **size)
+
+    build = ["build", "-A", "-F"]
+    if jobs is not None:
+        build += ["-j", str(jobs)] if jobs else ["-j"]
+    print("Timing builds...")
+    results["cold_build"] = run_cli(build + ["--clean"], home_path)
+    results["warm_build"] = run_cli(build, home_path)
+
+    print("Timing serve...")
+    process, url = start_server(home_path, engine)
+    try:
+        wait_for_builds(url)
+        latencies = measure_watch_latency(home_path, url, names[0], edits)
+        results["watch_latency"] = {
+            "edits": latencies,
+            "first": latencies[0],
+            "p50": percentile(latencies, 50),
+            "max": max(latencies),
+        }
+        paths = ["/"] + ["/{}/".format(n) for n in names]
+        paths += ["/{}/page_{}.html".format(n, i) for n in names for i in range(pages)]
+        results["serve"] = measure_throughput(url, paths, concurrency, duration)
+    finally:
+        process.terminate()
+        process.wait()
+
+    return {
+        "version": get_cli_version(),
+        "package": str(PACKAGE_ROOT / "metadocs"),
+        "date": datetime.datetime.now().astimezone().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "size": size,
+        "parameters": {
+            "jobs": jobs,
+            "engine": engine,
+            "edits": edits,
+            "concurrency": concurrency,
+            "duration": duration,
+        },
+        "results": results,
+    }
+
+
+def format_results(report):
+    """Summarize a benchmark's results
+
+    Args:
+        report (dict): from run_benchmarks
+
+    Returns:
+        str: the summary
+    """
+    results = report["results"]
+    serve = results["serve"]
+    lines = [
+        "{projects} projects, {packages} packages of {modules} modules "
+        "and {pages} pages each".format(**report["size"]),
+        "init:           {:.2f}s".format(results["init"]),
+        "cold build:     {:.2f}s".format(results["cold_build"]),
+        "warm build:     {:.2f}s".format(results["warm_build"]),
+        "watch latency:  {:.2f}s first, {:.2f}s median".format(
+            results["watch_latency"]["first"], results["watch_latency"]["p50"]
+        ),
+        "serve:          {:.0f} requests/s, p50 {:.1f}ms, p99 {:.1f}ms, "
+        "{} errors".format(
+            serve["requests_per_second"],
+            serve["p50"] * 1000,
+            serve["p99"] * 1000,
+            serve["errors"],
+        ),
+    ]
+    return "\n".join(lines)
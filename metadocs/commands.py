@@ -14,25 +14,41 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+import collections
+import datetime
 import getpass
+import json
 import os
-import socketserver
 import subprocess
 import sys
 import threading
 import time
 import warnings
-from http.server import SimpleHTTPRequestHandler
 from pathlib import Path
-from shutil import copyfile, copytree, move, rmtree
-
-import pexpect
-from watchdog.observers import Observer
+from shutil import copyfile, copytree, move
 
 from . import utils
-from .conf import __VERSION__, PORT
-
-from ruamel.yaml import YAML
+from .light_commands import clean
+from .conf import (
+    __VERSION__,
+    BENCH_CONCURRENCY,
+    BENCH_DURATION,
+    BENCH_MAX_URLS,
+    BENCH_OUTPUT,
+    BENCH_SIZE,
+    BUILD_PROFILE,
+    BUILDS_ROUTE,
+    CPROFILE_DIR,
+    DEBOUNCE,
+    HTML_LOCATION,
+    METADOCS_DIR,
+    METRICS_ROUTE,
+    PORT,
+    SEARCH_LIMIT,
+    SEARCH_ROUTE,
+    SERVE_BACKLOG,
+    SERVE_WORKERS,
+)
 
 def custom_formatwarning(msg, *args, **kwargs):
     # ignore everything except the message
@@ -51,97 +67,415 @@ def serve(args):
     Args:
         args (ArgumentParser): flags from the CLI
     """
+    from . import server
+
     # Sever's parameters
-    port = args.serve_port or PORT
+    port = PORT if args.serve_port is None else args.serve_port
     host = "0.0.0.0"
 
     # Current working directory
     dir_path = Path().absolute()
-    yaml = YAML()
-    mkdocs_yml = yaml.load(open(dir_path / 'mkdocs.yml'))
-    site_dir = mkdocs_yml['site_dir'] if 'site_dir' in mkdocs_yml else 'site'
-    web_dir = dir_path / site_dir
+    web_dir = dir_path / utils.get_site_dir(dir_path)
+    docs_dir = utils.get_docs_dir(dir_path)
 
     # Update routes
     utils.set_routes()
 
-    # Offline mode
+    # Offline mode: the Home Documentation is made offline by its
+    # initial rebuild
     if args.offline:
         os.environ["METADOCS_OFFLINE"] = "true"
-        _ = subprocess.check_output("mkdocs build > /dev/null", shell=True)
-        utils.make_offline()
 
-    class MetadocsHTTPHandler(SimpleHTTPRequestHandler):
-        """Class routing urls (paths) to projects (resources)
-        """
+    # Rebuilds triggered by the watcher
+    sphinx_daemon = utils.SphinxDaemon(dir_path)
+    # Served files kept in memory
+    if args.cache_size is None:
+        file_cache = server.FileCache()
+    elif args.cache_size > 0:
+        file_cache = server.FileCache(args.cache_size * 2 ** 20)
+    else:
+        file_cache = None
 
-        def translate_path(self, path):
-            # default root -> cwd
-            location = str(web_dir)
-            route = location
+    # Reported at METRICS_ROUTE
+    metrics = server.ServerMetrics(file_cache)
+    # Written by a background thread
+    if args.access_log == "off":
+        access_log = None
+    else:
+        access_log = server.AccessLog(args.access_log_file, fmt=args.access_log)
 
-            if len(path) != 0 and path != "/":
-                for key, loc in utils.get_routes():
-                    if path.startswith(key):
-                        location = loc
-                        path = path[len(key) :]
-                        break
+    scheduler = utils.RebuildScheduler(
+        sphinx_daemon, jobs=args.jobs, file_cache=file_cache, metrics=metrics
+    )
 
-            if location[-1] == "/" or not path or path[0] == "/":
-                route = location + path
-            else:
-                route = location + "/" + path
+    class MetadocsHTTPHandler(server.CachingHTTPRequestHandler):
+        """Class routing urls (paths) to projects (resources)
+        """
 
-            return route.split("?")[0]
+    MetadocsHTTPHandler.web_dir = web_dir
+    MetadocsHTTPHandler.file_cache = file_cache
+    MetadocsHTTPHandler.metrics = metrics
+    MetadocsHTTPHandler.access_log = access_log
+    MetadocsHTTPHandler.endpoints = {
+        BUILDS_ROUTE: lambda query: (
+            "application/json",
+            json.dumps(scheduler.status()).encode(),
+        ),
+        METRICS_ROUTE: lambda query: (
+            "text/plain; version=0.0.4; charset=utf-8",
+            metrics.render().encode(),
+        ),
+        SEARCH_ROUTE: lambda query: (
+            "application/json",
+            json.dumps(search(dir_path, query)).encode(),
+        ),
+    }
 
     # Serve as deamon thread
-    success = False
-    count = 0
-    print("Waiting for server port...")
-    try:
-        while not success:
+    while True:
+        try:
+            if args.engine == "asyncio":
+                httpd = server.AsyncHTTPServer(
+                    (host, port),
+                    MetadocsHTTPHandler,
+                    backlog=args.backlog or SERVE_BACKLOG,
+                )
+            else:
+                httpd = server.PooledHTTPServer(
+                    (host, port),
+                    MetadocsHTTPHandler,
+                    workers=args.workers or SERVE_WORKERS,
+                    backlog=args.backlog or SERVE_BACKLOG,
+                )
+            break
+        except OSError:
+            s = "port {} seems occupied. Try with {} ? (y/n)"
             try:
-                httpd = socketserver.TCPServer((host, port), MetadocsHTTPHandler)
-                success = True
-            except OSError:
-                count += 1
-            finally:
-                if not success and count > 20:
-                    s = "port {} seems occupied. Try with {} ? (y/n)"
-                    if "y" in input(s.format(port, port + 1)):
-                        port += 1
-                        count = 0
-                    else:
-                        print("You can specify a custom port with metadocs serve -s")
-                        return
-                time.sleep(0.5)
-    except KeyboardInterrupt:
-        print("Aborting.")
-        return
+                if port and "y" in input(s.format(port, port + 1)):
+                    port += 1
+                    continue
+            except (KeyboardInterrupt, EOFError):
+                print("Aborting.")
+                return
+            print("You can specify a custom port with metadocs serve -s")
+            return
 
-    httpd.allow_reuse_address = True
-    print("\nServing at http://{}:{}\n".format(host, port))
     thread = threading.Thread(target=httpd.serve_forever)
     thread.daemon = True
     thread.start()
 
+    # Serve the last builds while rebuilding what changed since then
+    def submit_stale_targets():
+        try:
+            stale_targets = utils.get_stale_targets(
+                dir_path, web_dir, dir_path / docs_dir, offline=args.offline
+            )
+            for target in stale_targets:
+                scheduler.submit(target)
+        finally:
+            scheduler.scanned.set()
+
+    thread = threading.Thread(target=submit_stale_targets)
+    thread.daemon = True
+    thread.start()
+
     # Watch for changes
+    rebuild_queue = utils.RebuildQueue(
+        scheduler,
+        quiet=DEBOUNCE if args.debounce is None else args.debounce,
+    )
+    patterns = ["*.rst", "*.md", "*.yml", "*.yaml"]
+    if args.watch_packages:
+        patterns.append("*.py")
     event_handler = utils.MetadocsFileHandler(
-        patterns=["*.rst", "*.md", "*.yml", "*.yaml"]
+        rebuild_queue, dir_path, packages=args.watch_packages, patterns=patterns
     )
+    from watchdog.observers import Observer
+
     observer = Observer()
-    observer.schedule(event_handler, path=str(dir_path), recursive=True)
+    event_handler.watch(observer)
     observer.start()
 
+    # Announced once changes are watched, so that edits made from now on
+    # are rebuilt. The actual port, if the system picked it
+    port = httpd.server_address[1]
+    print("\nServing at http://{}:{}\n".format(host, port))
+
     try:
         while True:
             time.sleep(1)
     except KeyboardInterrupt:
         observer.stop()
         httpd.server_close()
+        sphinx_daemon.close()
+        if access_log is not None:
+            access_log.close()
     observer.join()
 
 
+def search(dir_path, query):
+    """Answer a query of serve's SEARCH_ROUTE
+
+    Args:
+        dir_path (pathlib.Path): the Home Documentation's path
+        query (dict): the request's query parameters: q, the searched
+            words, and limit, the maximum number of results
+
+    Returns:
+        dict: the query and its results, see utils.SearchIndex.search
+    """
+    q = query.get("q", [""])[0]
+    try:
+        limit = int(query.get("limit", [SEARCH_LIMIT])[0])
+    except ValueError:
+        limit = SEARCH_LIMIT
+    index = utils.SearchIndex.load(dir_path)
+    results = index.search(q, max(0, limit)) if index is not None else []
+    return {"query": q, "results": results}
+
+
+# Outcome of a project's build: its mode ("clean", "incremental" or "skip"),
+# exit status, duration in seconds and the warnings sphinx printed
+ProjectBuild = collections.namedtuple(
+    "ProjectBuild", ["mode", "status", "duration", "warnings"]
+)
+
+
+class BuildResult:
+    """Outcome of build_documentation
+
+    Attributes:
+        projects (dict): ProjectBuild of each project, by name
+        home_status (int): 0 if the Home Documentation was built, 1 if its
+            build failed
+        home_duration (float): seconds the Home Documentation's build took
+        duration (float): seconds the whole build took
+    """
+
+    def __init__(self):
+        self.projects = {}
+        self.home_status = None
+        self.home_duration = 0
+        self.duration = 0
+
+    @property
+    def failed(self):
+        """list(str): projects whose build failed"""
+        return sorted(p for p, b in self.projects.items() if b.status)
+
+    @property
+    def ok(self):
+        """bool: whether all projects and the Home Documentation were built"""
+        return not self.failed and self.home_status == 0
+
+    def to_dict(self):
+        return {
+            "projects": {p: b._asdict() for p, b in sorted(self.projects.items())},
+            "home_status": self.home_status,
+            "home_duration": self.home_duration,
+            "duration": self.duration,
+        }
+
+
+def get_projects(dir_path):
+    """Find the sphinx projects of a Home Documentation
+
+    Args:
+        dir_path (pathlib.Path): the Home Documentation's path
+
+    Returns:
+        set(str): names of the directories with a source/ directory
+    """
+    return {
+        m
+        for m in os.listdir(dir_path)
+        if (dir_path / m).is_dir() and (dir_path / m / "source").is_dir()
+    }
+
+
+def timed_build_sphinx_project(
+    project_path, clean=True, cprofile_dir=None, peak_rss=False
+):
+    """utils.build_sphinx_project, timed from within the worker so that
+    waiting for a free worker is not counted
+
+    Args:
+        project_path (pathlib.Path): the project's directory
+        clean (bool, optional): Defaults to True. Whether to start from
+            a clean build directory
+        cprofile_dir (pathlib.Path, optional): Defaults to None. Where to
+            dump the build's cProfile stats, None not to profile it
+        peak_rss (bool, optional): Defaults to False. Whether to measure
+            the stages' peak RSS
+
+    Returns:
+        tuple(int, str, str, list(dict)): exit status, stdout and stderr of
+            the build and its stages, the whole build being the last one
+    """
+    profiler = utils.BuildProfiler(cprofile_dir, peak_rss)
+    with profiler.stage("sphinx", project_path.name):
+        status, out, err = utils.build_sphinx_project(project_path, clean, profiler)
+    return status, out, err, profiler.stages
+
+
+def build_documentation(
+    dir_path=None,
+    projects=None,
+    only_index=False,
+    clean=False,
+    jobs=1,
+    offline=False,
+    verbose=False,
+    quiet=False,
+    profiler=None,
+):
+    """Build projects and the Home Documentation, without prompting: the
+    API behind `metadocs build`, used by the other commands too.
+    Projects whose inputs did not change since their last build are
+    skipped, others are built in parallel and their link back to the
+    Documentation's Home is added.
+
+    Args:
+        dir_path (pathlib.Path, optional): Defaults to the current
+            directory. The Home Documentation's path
+        projects (iterable(str), optional): Defaults to all projects.
+            Projects to build, unknown ones are ignored
+        only_index (bool, optional): Defaults to False. Only build the
+            projects listed in the Documentation's Home
+        clean (bool, optional): Defaults to False. Rebuild projects from
+            scratch even if their inputs did not change
+        jobs (int, optional): Defaults to 1. Number of projects built at
+            once, 0 for all CPUs
+        offline (bool, optional): Defaults to False. Whether to make the
+            Home Documentation usable offline
+        verbose (bool, optional): Defaults to False. Print sphinx's and
+            mkdocs's output
+        quiet (bool, optional): Defaults to False. Print nothing, warnings
+            are still in the result
+        profiler (utils.BuildProfiler, optional): Defaults to None. Where
+            to record the build's stages
+
+    Returns:
+        BuildResult: what was built and how it went
+    """
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    profiler = profiler or utils.BuildProfiler()
+    total = profiler.start("total", profile=False)
+    dir_path = Path(dir_path or Path()).resolve()
+    result = BuildResult()
+
+    all_projects = get_projects(dir_path)
+    projects = all_projects if projects is None else all_projects & set(projects)
+    # Don't update projects which are not listed in the Documentation's Home
+    if only_index:
+        listed_projects = {p.strip("/") for p in utils.get_listed_projects(dir_path)}
+        projects &= listed_projects
+    if not quiet:
+        print("projects", projects)
+        warnings.warn("[sphinx]")
+
+    # Only rebuild projects whose inputs changed since their last build
+    manifest = utils.load_build_manifest(dir_path)
+    with profiler.stage("hash_inputs"):
+        hashes = {p: utils.hash_project_inputs(dir_path / p) for p in projects}
+    modes = {
+        p: "clean"
+        if clean
+        else utils.get_build_mode(
+            manifest.get(p), hashes[p], dir_path / p / HTML_LOCATION
+        )
+        for p in projects
+    }
+    for project in sorted(p for p in projects if modes[p] == "skip"):
+        result.projects[project] = ProjectBuild("skip", 0, 0.0, [])
+        if not quiet:
+            print("{} is up to date, skipping".format(project))
+
+    # Build projects concurrently, each in its own worker
+    jobs = jobs or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=max(1, jobs)) as executor:
+        futures = {
+            executor.submit(
+                timed_build_sphinx_project,
+                dir_path / p,
+                modes[p] == "clean",
+                profiler.cprofile_dir,
+                profiler.peak_rss,
+            ): p
+            for p in projects
+            if modes[p] != "skip"
+        }
+        for future in as_completed(futures):
+            project = futures[future]
+            try:
+                status, out, err, stages = future.result()
+            except Exception as e:
+                # A crashed worker only fails its project
+                status, out, stages = 1, "", []
+                err = "Building {} crashed: {!r}\n".format(project, e)
+            profiler.stages += stages
+            result.projects[project] = ProjectBuild(
+                modes[project],
+                status,
+                stages[-1]["wall"] if stages else 0.0,
+                err.splitlines(),
+            )
+
+            if not quiet:
+                if verbose:
+                    print(out, end="")
+                print(err, end="", file=sys.stderr)
+            if status == 0:
+                manifest[project] = hashes[project]
+            else:
+                # Force a clean build next time
+                manifest.pop(project, None)
+                if not quiet:
+                    print(
+                        "{}Building {} failed with exit status {}{}".format(
+                            utils.colors.FAIL, project, status, utils.colors.ENDC
+                        )
+                    )
+
+            # Add link to Documentation's Home
+            with profiler.stage("overwrite_view_source", project):
+                utils.overwrite_view_source(project, dir_path)
+            with profiler.stage("compress", project):
+                utils.compress_directory(dir_path / project / HTML_LOCATION)
+
+            if verbose and not quiet:
+                print("\n>>>>>> Done {}\n\n\n".format(project))
+
+    utils.save_build_manifest(dir_path, manifest)
+
+    # Build Documentation
+    if not verbose and not quiet:
+        warnings.warn("[mkdocs]")
+    with profiler.stage("mkdocs"):
+        built = utils.build_home_documentation(
+            dir_path, verbose=verbose and not quiet
+        )
+    result.home_status = 0 if built else 1
+    result.home_duration = profiler.stages[-1]["wall"]
+    if verbose and not quiet:
+        print("\n\n>>>>>> Build Complete.")
+
+    if offline:
+        with profiler.stage("make_offline"):
+            utils.make_offline(dir_path)
+
+    # One search index for all projects
+    with profiler.stage("search_index"):
+        utils.write_search_index(dir_path)
+
+    with profiler.stage("compress_site"):
+        utils.compress_directory(dir_path / utils.get_site_dir(dir_path))
+    profiler.stop(total)
+    result.duration = profiler.stages[-1]["wall"]
+    return result
+
+
 def build(args):
     """Build the documentation for the projects specified in the CLI.
     It will do 4 different things for each project the
@@ -163,11 +497,7 @@ def build(args):
     dir_path = Path().resolve()
 
     # Set of all available projects in the dir
-    all_projects = {
-        m
-        for m in os.listdir(dir_path)
-        if os.path.isdir(m) and "source" in os.listdir(dir_path / m)
-    }
+    all_projects = get_projects(dir_path)
 
     if args.all and args.projects:
         print(
@@ -205,45 +535,33 @@ def build(args):
             projects = all_projects
 
     if go:
-        # Update projects links
-        listed_projects = utils.get_listed_projects()
-
-        # Don't update projects which are not listed in the Documentation's
-        # Home if the -o flag was used
-        if args.only_index:
-            projects = listed_projects.intersection(projects)
-        print("projects", projects)
-        for project_to_build in projects:
-            # Re-build documentation
-            warnings.warn("[sphinx]")
-            if args.verbose:
-                os.system(
-                    "cd {} && make clean && make html".format(
-                        dir_path / project_to_build
-                    )
-                )
-            else:
-                os.system(
-                    "cd {} && make clean && make html > /dev/null".format(
-                        dir_path / project_to_build
-                    )
-                )
-
-            # Add link to Documentation's Home
-            utils.overwrite_view_source(project_to_build, dir_path)
-
-            if args.verbose:
-                print("\n>>>>>> Done {}\n\n\n".format(project_to_build))
-        # Build Documentation
-        if args.verbose:
-            os.system("mkdocs build")
-            print("\n\n>>>>>> Build Complete.")
-        else:
-            warnings.warn("[mkdocs]")
-            os.system("mkdocs build > /dev/null")
+        profiling = args.profile is not None or args.cprofile
+        cprofile_dir = None
+        if args.cprofile:
+            cprofile_dir = dir_path / METADOCS_DIR / CPROFILE_DIR
+        profiler = utils.BuildProfiler(cprofile_dir, peak_rss=profiling)
+        build_documentation(
+            dir_path,
+            projects,
+            only_index=args.only_index,
+            clean=args.clean,
+            jobs=1 if args.jobs is None else args.jobs,
+            offline=args.offline,
+            verbose=args.verbose,
+            profiler=profiler,
+        )
 
-        if args.offline:
-            utils.make_offline()
+        if profiling:
+            report_path = (
+                Path(args.profile)
+                if args.profile
+                else dir_path / METADOCS_DIR / BUILD_PROFILE
+            )
+            profiler.save(report_path)
+            print("\n" + profiler.summary())
+            print("\nProfile saved to {}".format(report_path))
+            if cprofile_dir is not None:
+                print("cProfile stats saved to {}".format(cprofile_dir))
 
 
 def init(args):
@@ -278,6 +596,8 @@ def init(args):
 
     file_path = Path(__file__).resolve().parent / "include"
 
+    from ruamel.yaml import YAML
+
     yaml = YAML()
     mkdocs_yml = yaml.load(open(file_path / 'mkdocs.yml'))
     docs_dir = mkdocs_yml['docs_dir'] if 'docs_dir' in mkdocs_yml else 'docs'
@@ -333,9 +653,13 @@ def init(args):
     if not static.exists():
         static.mkdir()
 
-    _ = subprocess.check_output(
-        "cd {} && metadocs build -F -A > /dev/null".format(args.project_name), shell=True
-    )
+    result = build_documentation(project_path, quiet=True)
+    if not result.ok:
+        print(
+            "{}Building the example documentation failed{}".format(
+                utils.colors.FAIL, utils.colors.ENDC
+            )
+        )
 
     print(
         "\n\n",
@@ -367,12 +691,9 @@ def init(args):
     )
 
 
-def version(args):
-    if args.version:
-        print(__VERSION__)
-
-
 def autodoc(args):
+    import pexpect
+
     author = getpass.getuser()
     project = Path().resolve().name
 
@@ -400,7 +721,7 @@ def autodoc(args):
             )
             + " ./build/ and ./source/ folders) [y/n] : "
         ):
-            _ = subprocess.check_output("metadocs clean", shell=True)
+            clean(args)
             child = pexpect.spawnu("sphinx-quickstart", ["./"], encoding="utf-8")
             child.expect("> Separate source and build directories*")
         else:
@@ -478,7 +799,7 @@ def autodoc(args):
             "with an importable project package",
         )
         print("Cleaning...", end="")
-        _ = subprocess.check_output("metadocs clean", shell=True)
+        clean(args)
         print(u"\u2713")
         return
 
@@ -495,9 +816,10 @@ def autodoc(args):
     else:
         utils.add_project_to_doc_index(index, project)
 
-    _ = subprocess.check_output(
-        "cd .. && metadocs build -F -p {} > /dev/null".format(project), shell=True
-    )
+    result = build_documentation(Path().resolve().parent, [project], quiet=True)
+    built = result.projects.get(project)
+    if built is not None and built.warnings:
+        print("\n".join(built.warnings), file=sys.stderr)
 
     print(
         u"""\n    Added configuration file source/conf.py
@@ -516,14 +838,120 @@ def autodoc(args):
     )
 
 
-def clean(args):
-    rmtree("source", ignore_errors=True)
-    rmtree("build", ignore_errors=True)
-    try:
-        os.remove("Makefile")
-    except FileNotFoundError:
-        pass
+def bench(args):
+    """Generate a Home Documentation of the requested size in a temporary
+    directory, time init, builds, the watcher and serve on it and write
+    the results to a JSON file
+
+    Args:
+        args (ArgumentParser): parsed args from an ArgumentParser
+    """
+    import tempfile
+
+    from . import benchmarks
+
+    size = {
+        key: BENCH_SIZE[key] if value is None else value
+        for key, value in [
+            ("projects", args.n_projects),
+            ("packages", args.n_packages),
+            ("modules", args.n_modules),
+            ("pages", args.n_pages),
+        ]
+    }
+    output = Path(args.bench_output or BENCH_OUTPUT).resolve()
+
+    with tempfile.TemporaryDirectory(prefix="metadocs-bench-") as tmp:
+        dir_path = Path(args.bench_dir or tmp).resolve()
+        dir_path.mkdir(parents=True, exist_ok=True)
+        if any(dir_path.iterdir()):
+            print(
+                "{}Error:{} {} is not empty".format(
+                    utils.colors.FAIL, utils.colors.ENDC, dir_path
+                )
+            )
+            return
+        report = benchmarks.run_benchmarks(
+            dir_path, jobs=args.jobs, engine=args.engine, **size
+        )
+
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(benchmarks.format_results(report))
+    print("Results written to {}".format(output))
+
+
+@utils.suggest_path
+def bench_serve(args):
+    """Request pages from a running serve instance, or from one started for
+    the Home Documentation in the current directory, and report throughput,
+    latency percentiles and error rates by route prefix
+
+    Args:
+        args (ArgumentParser): parsed args from an ArgumentParser
+    """
+    from . import benchmarks
+
+    concurrency = args.concurrency or BENCH_CONCURRENCY
+    duration = args.duration or BENCH_DURATION
+    max_urls = args.max_urls or BENCH_MAX_URLS
+    keep_alive = not args.no_keep_alive
+
+    process = None
+    if args.url:
+        url = args.url.rstrip("/")
+        print("Crawling {}...".format(url))
+        paths = benchmarks.crawl(url, max_paths=max_urls)
+    else:
+        dir_path = Path().resolve()
+        paths = benchmarks.get_served_paths(dir_path)
+        # Evenly spaced across the site and projects
+        paths = paths[:: -(-len(paths) // max_urls) or 1]
+        options = []
+        for flag, value in [
+            ("--workers", args.workers),
+            ("--backlog", args.backlog),
+            ("--cache_size", args.cache_size),
+        ]:
+            if value is not None:
+                options += [flag, str(value)]
+        process, url = benchmarks.start_server(dir_path, args.engine, options)
+
     try:
-        os.remove("make.bat")
-    except FileNotFoundError:
-        pass
+        if not paths:
+            print("{}No pages found{}".format(utils.colors.FAIL, utils.colors.ENDC))
+            return
+        if process is not None:
+            # Startup rebuilds would skew the measures
+            benchmarks.wait_for_builds(url)
+        print(
+            "Requesting {} pages from {} with {} clients for {}s, keep-alive {}".format(
+                len(paths), url, concurrency, duration, "on" if keep_alive else "off"
+            )
+        )
+        results = benchmarks.measure_throughput(
+            url, paths, concurrency, duration, keep_alive
+        )
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    print(benchmarks.format_throughput(results))
+    if args.bench_output:
+        report = {
+            "version": __VERSION__,
+            "date": datetime.datetime.now().astimezone().isoformat(),
+            "url": url,
+            "paths": len(paths),
+            "parameters": {
+                "concurrency": concurrency,
+                "duration": duration,
+                "keep_alive": keep_alive,
+            },
+            "results": results,
+        }
+        output = Path(args.bench_output).resolve()
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+        print("Results written to {}".format(output))
@@ -24,9 +24,73 @@ PROJECT_KEY = "# Projects"
 HTML_LOCATION = "build/html/"
 # mkdocs's home file
 MKDOCS_INDEX = "docs/index.md"
+# Directory, in the Home Documentation, where metadocs keeps its state
+METADOCS_DIR = ".metadocs"
+# Content hashes of each project's inputs at its last successful build
+BUILD_MANIFEST = "build_manifest.json"
+# Default report of build --profile, in METADOCS_DIR
+BUILD_PROFILE = "build_profile.json"
+# Directory of build --cprofile's dumps, in METADOCS_DIR
+CPROFILE_DIR = "cprofile"
+# Directories of a project's source/ which hold its theme's customization
+THEME_DIRS = ["_templates", "_themes", "_static"]
 
 # Substring marking the line to replace
 TO_REPLACE_WITH_HOME = '<a href="_sources'
 # New line replacing the above one
 NEW_HOME_LINK = '<h3><a href="/">Home</a></h3>'
 PORT = 8443
+# Number of requests serve handles at once
+SERVE_WORKERS = 16
+# Number of connections waiting to be accepted by serve
+SERVE_BACKLOG = 64
+# Seconds the threaded engine waits for a client's request before freeing
+# its worker, e.g. for browsers' preconnected sockets
+SERVE_TIMEOUT = 5
+# Route where serve reports its queued, running and finished builds
+BUILDS_ROUTE = "/_metadocs/builds"
+# Route where serve reports its metrics, in Prometheus' text format
+METRICS_ROUTE = "/_metadocs/metrics"
+# Upper bounds, in seconds, of the buckets of the requests' latency histograms
+LATENCY_BUCKETS = [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5]
+# Upper bounds, in seconds, of the buckets of the rebuilds' duration histograms
+REBUILD_BUCKETS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120]
+# Seconds between two writes of serve's access log
+ACCESS_LOG_INTERVAL = 0.5
+# Number of access log records waiting to be written, older ones are dropped
+ACCESS_LOG_BUFFER = 10000
+# Seconds an idle connection is kept open by serve's asyncio engine
+KEEP_ALIVE_TIMEOUT = 15
+# Bytes of served files serve keeps in memory
+FILE_CACHE_SIZE = 64 * 2 ** 20
+# Size of the largest file serve keeps in memory
+FILE_CACHE_MAX_FILE = 4 * 2 ** 20
+# Built files worth sending compressed
+COMPRESSIBLE_SUFFIXES = {".html", ".css", ".js", ".json", ".svg", ".txt", ".xml"}
+# Size of the smallest file worth compressing
+COMPRESS_MIN_SIZE = 1024
+# Content encodings of precompressed files and their suffix, preferred first
+COMPRESSED_SIDECARS = [("br", ".br"), ("gzip", ".gz")]
+# Seconds without file changes the watcher waits for before rebuilding
+DEBOUNCE = 0.3
+# Size of the Home Documentation generated by bench: projects, packages of
+# each project, modules of each package and .rst pages of each project
+BENCH_SIZE = {"projects": 5, "packages": 2, "modules": 5, "pages": 10}
+# File bench writes its results to
+BENCH_OUTPUT = "bench.json"
+# Number of clients bench-serve requests pages with
+BENCH_CONCURRENCY = 8
+# Seconds bench-serve requests pages for
+BENCH_DURATION = 10
+# Number of paths bench-serve requests in turn
+BENCH_MAX_URLS = 1000
+# Search index of all projects and the Home Documentation, in its site_dir
+SEARCH_INDEX = "search/metadocs_index.json"
+# Route where serve answers search queries: ?q=your+query&limit=20
+SEARCH_ROUTE = "/_metadocs/search"
+# Number of results of a search query, unless the query asks for more
+SEARCH_LIMIT = 20
+# Weight of a term in a page by where it appears
+SEARCH_WEIGHTS = {"object": 15, "title": 10, "section": 5, "text": 1}
+# Weight factor of terms a query's word is only a prefix of
+SEARCH_PARTIAL = 0.5
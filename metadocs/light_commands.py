@@ -0,0 +1,40 @@
+# metadocs: Manage sphinx documentations with mkdocs
+# Copyright (C) 2018  Victor Schmidt vsch[at]pm.me
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Commands which only need the standard library: running them imports
+# neither metadocs's utils nor its dependencies
+import os
+from shutil import rmtree
+
+from .conf import __VERSION__
+
+
+def version(args):
+    if args.version:
+        print(__VERSION__)
+
+
+def clean(args):
+    rmtree("source", ignore_errors=True)
+    rmtree("build", ignore_errors=True)
+    try:
+        os.remove("Makefile")
+    except FileNotFoundError:
+        pass
+    try:
+        os.remove("make.bat")
+    except FileNotFoundError:
+        pass
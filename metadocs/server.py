@@ -0,0 +1,1128 @@
+# metadocs: Manage sphinx documentations with mkdocs
+# Copyright (C) 2018  Victor Schmidt vsch[at]pm.me
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import collections
+import datetime
+import email.utils
+import http.client
+import io
+import json
+import mimetypes
+import os
+import posixpath
+import socket
+import socketserver
+import sys
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from http.server import SimpleHTTPRequestHandler
+from shutil import copyfileobj
+
+from .conf import (
+    __VERSION__,
+    ACCESS_LOG_BUFFER,
+    ACCESS_LOG_INTERVAL,
+    COMPRESSED_SIDECARS,
+    FILE_CACHE_MAX_FILE,
+    FILE_CACHE_SIZE,
+    KEEP_ALIVE_TIMEOUT,
+    LATENCY_BUCKETS,
+    REBUILD_BUCKETS,
+    SERVE_BACKLOG,
+    SERVE_TIMEOUT,
+    SERVE_WORKERS,
+)
+from .utils import HOME_TARGET, get_route_table
+
+
+class PooledHTTPServer(socketserver.TCPServer):
+    """TCP server handling requests in a fixed-size pool of threads, so that
+    a slow client does not hold the others back. When all workers are busy,
+    new connections wait in the listening socket's backlog. The address is
+    reused, so that restarting serve does not wait for the previous
+    server's connections to time out.
+
+    Args:
+        server_address (tuple(str, int)): host and port to bind
+        RequestHandlerClass (type): handler of each request
+        workers (int, optional): Defaults to conf.SERVE_WORKERS. Number of
+            requests handled at once
+        backlog (int, optional): Defaults to conf.SERVE_BACKLOG. Maximum
+            number of connections waiting to be accepted
+    """
+
+    allow_reuse_address = True
+
+    def __init__(
+        self,
+        server_address,
+        RequestHandlerClass,
+        workers=SERVE_WORKERS,
+        backlog=SERVE_BACKLOG,
+        bind_and_activate=True,
+    ):
+        self.request_queue_size = backlog
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.slots = threading.BoundedSemaphore(workers)
+        super().__init__(server_address, RequestHandlerClass, bind_and_activate)
+
+    def process_request(self, request, client_address):
+        # Stop accepting until a worker is free
+        self.slots.acquire()
+        self.executor.submit(self.process_request_thread, request, client_address)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self.slots.release()
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=False)
+
+
+class FileCache:
+    """Size-bounded LRU cache of files' content, keyed by path, modification
+    time and size so that a changed file is never served from the cache.
+    Files larger than `max_file_size` are not cached.
+
+    Args:
+        max_size (int, optional): Defaults to conf.FILE_CACHE_SIZE. Maximum
+            number of bytes cached
+        max_file_size (int, optional): Defaults to conf.FILE_CACHE_MAX_FILE.
+            Size of the largest file to cache
+    """
+
+    def __init__(self, max_size=FILE_CACHE_SIZE, max_file_size=FILE_CACHE_MAX_FILE):
+        self.max_size = max_size
+        self.max_file_size = min(max_file_size, max_size)
+        self.entries = collections.OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, path, stat):
+        """Get a file's content, reading it on a cache miss
+
+        Args:
+            path (str): the file's path
+            stat (os.stat_result): the file's current stat
+
+        Returns:
+            bytes: the file's content, or None if it is too large to cache
+        """
+        if stat.st_size > self.max_file_size:
+            return None
+
+        key = (path, stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            content = self.entries.get(key)
+            if content is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return content
+            self.misses += 1
+
+        with open(path, "rb") as f:
+            content = f.read()
+
+        with self.lock:
+            if key not in self.entries and len(content) <= self.max_file_size:
+                self.entries[key] = content
+                self.size += len(content)
+                while self.size > self.max_size:
+                    _, evicted = self.entries.popitem(last=False)
+                    self.size -= len(evicted)
+        return content
+
+    def evict(self, directory):
+        """Forget the files of a directory, e.g. once it has been rebuilt
+
+        Args:
+            directory (pathlib.Path or str): the directory
+        """
+        directory = str(directory).rstrip(os.sep) + os.sep
+        with self.lock:
+            for key in [k for k in self.entries if k[0].startswith(directory)]:
+                self.size -= len(self.entries.pop(key))
+
+
+class Histogram:
+    """Distribution of observed values, counted in cumulative buckets like
+    Prometheus' histograms
+
+    Args:
+        buckets (list(float)): upper bounds of the buckets, sorted
+    """
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+
+
+def format_labels(**labels):
+    """Format labels of a Prometheus sample
+
+    Returns:
+        str: the labels, between braces
+    """
+    escaped = (
+        (k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in labels.items()
+    )
+    return "{" + ",".join('{}="{}"'.format(k, v) for k, v in escaped) + "}"
+
+
+class ServerMetrics:
+    """What serve does, reported by its request handlers and rebuild
+    scheduler and rendered in Prometheus' text format: requests by route
+    (the project serving them, HOME_TARGET for the Home Documentation) and
+    status code, their latency and bytes sent, open connections, the file
+    cache's hit ratio and rebuilds' durations.
+
+    Args:
+        file_cache (FileCache, optional): Defaults to None. The served
+            files' cache
+    """
+
+    def __init__(self, file_cache=None):
+        self.file_cache = file_cache
+        self.requests = collections.Counter()
+        self.bytes_sent = collections.Counter()
+        self.latencies = {}
+        self.rebuilds = {}
+        self.connections = 0
+        self.lock = threading.Lock()
+
+    def open_connection(self):
+        with self.lock:
+            self.connections += 1
+
+    def close_connection(self):
+        with self.lock:
+            self.connections -= 1
+
+    def observe_request(self, route, status, size, duration):
+        """Count an answered request
+
+        Args:
+            route (str): the route which answered it
+            status (int): the response's status code
+            size (int): bytes of the response's body
+            duration (float): seconds taken to answer
+        """
+        with self.lock:
+            self.requests[route, status] += 1
+            self.bytes_sent[route] += size
+            if route not in self.latencies:
+                self.latencies[route] = Histogram(LATENCY_BUCKETS)
+            self.latencies[route].observe(duration)
+
+    def observe_rebuild(self, target, result, duration):
+        """Count a rebuild
+
+        Args:
+            target (str): a project's name, or HOME_TARGET
+            result (str): "success", "failure" or "cancelled"
+            duration (float): seconds the rebuild took
+        """
+        with self.lock:
+            if (target, result) not in self.rebuilds:
+                self.rebuilds[target, result] = Histogram(REBUILD_BUCKETS)
+            self.rebuilds[target, result].observe(duration)
+
+    def render(self):
+        """Render the metrics
+
+        Returns:
+            str: the metrics in Prometheus' text format
+        """
+        lines = []
+
+        def declare(name, kind, description):
+            lines.append("# HELP {} {}".format(name, description))
+            lines.append("# TYPE {} {}".format(name, kind))
+
+        def sample(name, value, **labels):
+            labels = format_labels(**labels) if labels else ""
+            lines.append("{}{} {}".format(name, labels, value))
+
+        def histogram_samples(name, histogram, **labels):
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                sample(name + "_bucket", count, **labels, le=bound)
+            sample(name + "_bucket", histogram.count, **labels, le="+Inf")
+            sample(name + "_sum", histogram.sum, **labels)
+            sample(name + "_count", histogram.count, **labels)
+
+        with self.lock:
+            name = "metadocs_http_requests_total"
+            declare(name, "counter", "Requests answered, by route and status code")
+            for (route, status), count in sorted(self.requests.items()):
+                sample(name, count, route=route, code=status)
+
+            name = "metadocs_http_request_duration_seconds"
+            declare(name, "histogram", "Time taken to answer requests, by route")
+            for route, histogram in sorted(self.latencies.items()):
+                histogram_samples(name, histogram, route=route)
+
+            name = "metadocs_http_sent_bytes_total"
+            declare(name, "counter", "Bytes of response bodies sent, by route")
+            for route, size in sorted(self.bytes_sent.items()):
+                sample(name, size, route=route)
+
+            name = "metadocs_http_open_connections"
+            declare(name, "gauge", "Connections currently open")
+            sample(name, self.connections)
+
+            name = "metadocs_rebuild_duration_seconds"
+            declare(name, "histogram", "Time taken by the watcher's rebuilds")
+            for (target, result), histogram in sorted(self.rebuilds.items()):
+                histogram_samples(name, histogram, target=target, result=result)
+
+        if self.file_cache is not None:
+            with self.file_cache.lock:
+                hits, misses = self.file_cache.hits, self.file_cache.misses
+                size = self.file_cache.size
+            declare("metadocs_file_cache_hits_total", "counter", "File cache hits")
+            sample("metadocs_file_cache_hits_total", hits)
+            declare("metadocs_file_cache_misses_total", "counter", "File cache misses")
+            sample("metadocs_file_cache_misses_total", misses)
+            declare(
+                "metadocs_file_cache_hit_ratio",
+                "gauge",
+                "Share of the file cache's lookups which were hits",
+            )
+            sample("metadocs_file_cache_hit_ratio", hits / (hits + misses or 1))
+            declare(
+                "metadocs_file_cache_bytes", "gauge", "Bytes held by the file cache"
+            )
+            sample("metadocs_file_cache_bytes", size)
+
+        return "\n".join(lines) + "\n"
+
+
+class AccessLog:
+    """Log of the requests serve answers. Records are only queued by the
+    request handlers, a background thread formats and writes them in
+    batches so that a slow terminal or disk never delays responses. When
+    the writer falls behind, the oldest records are dropped.
+
+    Args:
+        path (str, optional): Defaults to None. File to append the log to,
+            stderr if None
+        fmt (str, optional): Defaults to "common". "common" for the Common
+            Log Format, "json" for JSON lines
+        interval (float, optional): Defaults to conf.ACCESS_LOG_INTERVAL.
+            Seconds between two writes
+        buffer (int, optional): Defaults to conf.ACCESS_LOG_BUFFER. Number
+            of records waiting to be written
+    """
+
+    def __init__(
+        self,
+        path=None,
+        fmt="common",
+        interval=ACCESS_LOG_INTERVAL,
+        buffer=ACCESS_LOG_BUFFER,
+    ):
+        self.stream = open(path, "a") if path else sys.stderr
+        self.fmt = fmt
+        self.interval = interval
+        self.records = collections.deque(maxlen=buffer)
+        self.dropped = 0
+        self.closed = threading.Event()
+
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def log(self, client, request_line, status, size, duration, route):
+        """Queue a request's record
+
+        Args:
+            client (str): the client's address
+            request_line (str): the request's first line
+            status (int): the response's status code
+            size (int): bytes of the response's body
+            duration (float): seconds taken to answer
+            route (str): the route which answered
+        """
+        if len(self.records) == self.records.maxlen:
+            self.dropped += 1
+        self.records.append(
+            (time.time(), client, request_line, status, size, duration, route)
+        )
+
+    def flush(self):
+        """Write the queued records
+        """
+        lines = []
+        while True:
+            try:
+                record = self.records.popleft()
+            except IndexError:
+                break
+            lines.append(self.format(*record))
+        if self.dropped:
+            dropped, self.dropped = self.dropped, 0
+            lines.append("[access log] {} records dropped\n".format(dropped))
+        if lines:
+            self.stream.write("".join(lines))
+            self.stream.flush()
+
+    def format(self, timestamp, client, request_line, status, size, duration, route):
+        """Format a record as a line of the log
+
+        Returns:
+            str: the line
+        """
+        if self.fmt == "json":
+            method, _, rest = request_line.partition(" ")
+            path, _, protocol = rest.rpartition(" ")
+            record = {
+                "time": datetime.datetime.fromtimestamp(timestamp)
+                .astimezone()
+                .isoformat(),
+                "client": client,
+                "method": method,
+                "path": path,
+                "protocol": protocol,
+                "status": status,
+                "bytes": size,
+                "duration": round(duration, 6),
+                "route": route,
+            }
+            return json.dumps(record) + "\n"
+        return '{} - - [{}] "{}" {} {}\n'.format(
+            client,
+            time.strftime("%d/%b/%Y:%H:%M:%S %z", time.localtime(timestamp)),
+            request_line,
+            status,
+            size if size else "-",
+        )
+
+    def close(self):
+        """Stop the writer, write what is left and close the log's file
+        """
+        self.closed.set()
+        self.thread.join()
+        self.flush()
+        if self.stream is not sys.stderr:
+            self.stream.close()
+
+    def _run(self):
+        while not self.closed.wait(self.interval):
+            try:
+                self.flush()
+            except (OSError, ValueError):
+                return
+
+
+def get_route_label(path, endpoints=()):
+    """Label of the route answering a path in serve's metrics
+
+    Args:
+        path (str): the requested path
+        endpoints (dict, optional): routes answered by a function
+
+    Returns:
+        str: the endpoint or the matched route's pattern, HOME_TARGET if no
+            project's route matches
+    """
+    path = path.split("?")[0]
+    if path in endpoints:
+        return path
+    return get_route_table().match(path)[0] or HOME_TARGET
+
+
+def translate_url(web_dir, path):
+    """Find the file a url path points to: paths starting with a project's
+    route are looked for in its built html, others in the Home
+    Documentation's site
+
+    Args:
+        web_dir (pathlib.Path or str): the Home Documentation's site_dir
+        path (str): the requested path, possibly with a query string
+
+    Returns:
+        str: path of the requested file or directory
+    """
+    path = path.split("?")[0].split("#")[0]
+    trailing_slash = path.endswith("/")
+    # Never go above the served directories
+    path = posixpath.normpath(urllib.parse.unquote(path))
+    if trailing_slash and path != "/":
+        path += "/"
+
+    # default root -> cwd
+    location = str(web_dir)
+    route = location
+
+    if len(path) != 0 and path != "/":
+        key, loc = get_route_table().match(path)
+        if key is not None:
+            location = loc
+            path = path[len(key) :]
+
+    if location[-1] == "/" or not path or path[0] == "/":
+        route = location + path
+    else:
+        route = location + "/" + path
+
+    return route
+
+
+def choose_encoding(path, stat, accept_encoding):
+    """Pick the precompressed sidecar of a file (see compress_directory) the
+    client prefers: the acceptable encoding with the highest q-value,
+    COMPRESSED_SIDECARS' order breaking ties. Sidecars older than the file
+    are ignored, and so are encodings the client ranks below identity.
+
+    Args:
+        path (str): the requested file's path
+        stat (os.stat_result): the requested file's stat
+        accept_encoding (str): the request's Accept-Encoding header
+
+    Returns:
+        tuple(str, str, os.stat_result): the content encoding (None if
+            the file should be sent as is), path and stat of the file
+            to send
+    """
+    accepted = {}
+    for coding in (accept_encoding or "").split(","):
+        name, _, params = coding.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                pass
+        accepted[name.strip().lower()] = quality
+
+    # Identity only beats the encodings it is explicitly ranked above
+    identity = accepted.get("identity", 0)
+    candidates = []
+    for preference, (encoding, suffix) in enumerate(COMPRESSED_SIDECARS):
+        quality = accepted.get(encoding, accepted.get("*", 0))
+        if quality > 0 and quality >= identity:
+            candidates.append((-quality, preference, encoding, suffix))
+
+    for _, _, encoding, suffix in sorted(candidates):
+        try:
+            sidecar_stat = os.stat(path + suffix)
+        except OSError:
+            continue
+        if sidecar_stat.st_mtime_ns >= stat.st_mtime_ns:
+            return encoding, path + suffix, sidecar_stat
+    return None, path, stat
+
+
+def is_not_modified(headers, etag, stat):
+    """Whether the client's cached copy of a file is still valid
+
+    Args:
+        headers (email.message.Message): the request's headers
+        etag (str): the file's current ETag
+        stat (os.stat_result): the file's current stat
+
+    Returns:
+        bool: True if a 304 Not Modified should be sent
+    """
+    if_none_match = headers.get("If-None-Match")
+    if if_none_match is not None:
+        tags = [t.strip() for t in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+
+    if_modified_since = headers.get("If-Modified-Since")
+    if if_modified_since is not None:
+        try:
+            since = email.utils.parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError, IndexError, OverflowError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=datetime.timezone.utc)
+        return int(stat.st_mtime) <= since.timestamp()
+    return False
+
+
+def get_byte_range(headers, etag, stat):
+    """Find the single byte range a request asks for with its Range header.
+    Ranges are ignored if If-Range doesn't match the file anymore, and
+    requests for several ranges are answered with the whole file.
+
+    Args:
+        headers (email.message.Message): the request's headers
+        etag (str): the file's current ETag
+        stat (os.stat_result): the file's current stat
+
+    Raises:
+        ValueError: if the range can't be satisfied
+
+    Returns:
+        tuple(int, int): first and last bytes of the range, None to send
+            the whole file
+    """
+    range_header = headers.get("Range")
+    if not range_header or not range_header.startswith("bytes="):
+        return None
+
+    if_range = headers.get("If-Range")
+    if if_range is not None:
+        if if_range.startswith(('"', "W/")):
+            if if_range != etag:
+                return None
+        else:
+            try:
+                since = email.utils.parsedate_to_datetime(if_range).timestamp()
+            except (TypeError, ValueError, IndexError, OverflowError):
+                return None
+            if int(stat.st_mtime) != since:
+                return None
+
+    spec = range_header[len("bytes=") :].strip()
+    if "," in spec or "-" not in spec:
+        return None
+    first, last = (v.strip() for v in spec.split("-", 1))
+    if not (first or last) or not all(v.isdigit() for v in (first, last) if v):
+        return None
+    size = stat.st_size
+    if first:
+        start = int(first)
+        end = int(last) if last else size - 1
+        if last and end < start:
+            return None
+    else:
+        # Suffix range, the last bytes of the file
+        start, end = size - int(last), size - 1
+    # No range of an empty file is satisfiable
+    if start >= size or size == 0:
+        raise ValueError("Range not satisfiable")
+    return max(start, 0), min(end, size - 1)
+
+
+class FileRegion:
+    """A region of a file to send as a response's body, with sendfile(2)
+    when available so that its bytes are never copied through Python
+
+    Args:
+        path (str): the file
+        offset (int): position of the region's first byte
+        length (int): size of the region
+
+    Raises:
+        OSError: the file can't be opened or is shorter than the region,
+            e.g. rewritten by a rebuild since it was stat'ed
+    """
+
+    def __init__(self, path, offset, length):
+        self.file = open(path, "rb")
+        if os.fstat(self.file.fileno()).st_size < offset + length:
+            self.file.close()
+            raise OSError("{} is shorter than expected".format(path))
+        self.offset = offset
+        self.length = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.length:
+            size = self.length
+        self.file.seek(self.offset)
+        data = self.file.read(size)
+        self.offset += len(data)
+        self.length -= len(data)
+        return data
+
+    def send(self, connection, outputfile):
+        """Send the region through a connection. If the file was truncated
+        meanwhile, length is left above 0 by the bytes that weren't sent
+
+        Args:
+            connection (socket.socket): the connection's socket
+            outputfile (io.BufferedIOBase): the connection's file, used if
+                sendfile is not available
+        """
+        if not hasattr(os, "sendfile"):
+            copyfileobj(self, outputfile)
+            return
+        outputfile.flush()
+        while self.length > 0:
+            sent = os.sendfile(
+                connection.fileno(), self.file.fileno(), self.offset, self.length
+            )
+            if sent == 0:
+                break
+            self.offset += sent
+            self.length -= sent
+
+    def close(self):
+        self.file.close()
+
+
+def find_index(path):
+    """Find the index file of a directory
+
+    Args:
+        path (str): the directory
+
+    Returns:
+        str: the path of its index.html (or .htm), None if it has none
+    """
+    for index in ("index.html", "index.htm"):
+        if os.path.isfile(os.path.join(path, index)):
+            return os.path.join(path, index)
+    return None
+
+
+def error_response(status):
+    """Build an error response
+
+    Args:
+        status (int): the HTTP status
+
+    Returns:
+        tuple(int, list(tuple(str, str)), bytes): status, headers and body
+    """
+    phrase = HTTPStatus(status).phrase
+    body = "<html><body><h1>{} {}</h1></body></html>".format(status, phrase)
+    return status, [("Content-Type", "text/html;charset=utf-8")], body.encode()
+
+
+def get_response(target, headers, web_dir, file_cache=None, endpoints=()):
+    """Find what to answer to a GET or HEAD request, for both of serve's
+    engines: files are sent with strong ETags, If-None-Match and
+    If-Modified-Since are answered with 304 Not Modified, precompressed
+    files are sent to the clients accepting them, single byte ranges are
+    supported and hot files are served from memory
+
+    Args:
+        target (str): the requested path, possibly with a query string
+        headers (email.message.Message): the request's headers
+        web_dir (pathlib.Path or str): the Home Documentation's site_dir,
+            urls are translated with translate_url
+        file_cache (FileCache, optional): Defaults to None. Cache of the
+            served files, None to always read them from disk
+        endpoints (dict, optional): routes answered by a function instead
+            of a file, called with the request's query parameters (see
+            urllib.parse.parse_qs) and returning the response's content
+            type and body
+
+    Returns:
+        tuple(int, list(tuple(str, str)), bytes or tuple(str, int, int)):
+            status, headers and either the body or the path, offset and
+            length of the file region to send as body. None if the target
+            is a directory without an index. Content-Length is left to the
+            caller.
+    """
+    url = urllib.parse.urlsplit(target)
+    endpoint = endpoints.get(url.path)
+    if endpoint is not None:
+        content_type, content = endpoint(urllib.parse.parse_qs(url.query))
+        return (
+            200,
+            [("Content-Type", content_type), ("Cache-Control", "no-store")],
+            content,
+        )
+
+    path = translate_url(web_dir, target)
+    if os.path.isdir(path):
+        if not url.path.endswith("/"):
+            location = url.path + "/" + ("?" + url.query if url.query else "")
+            return 301, [("Location", location)], b""
+        path = find_index(path)
+        if path is None:
+            return None
+    try:
+        stat = os.stat(path)
+    except (OSError, TypeError):
+        return error_response(404)
+    if not os.path.isfile(path):
+        return error_response(404)
+
+    # Send a precompressed version of the file if the client accepts it,
+    # ranges are only served from the file itself
+    if headers.get("Range"):
+        encoding, body_path, body_stat = None, path, stat
+    else:
+        encoding, body_path, body_stat = choose_encoding(
+            path, stat, headers.get("Accept-Encoding")
+        )
+    etag = '"{:x}-{:x}{}"'.format(
+        stat.st_mtime_ns, stat.st_size, "-" + encoding if encoding else ""
+    )
+    # Browsers may keep files but have to revalidate them, as they change
+    # whenever a project is rebuilt
+    response_headers = [
+        ("ETag", etag),
+        ("Cache-Control", "no-cache"),
+        ("Vary", "Accept-Encoding"),
+    ]
+    if is_not_modified(headers, etag, stat):
+        return 304, response_headers, b""
+
+    try:
+        byte_range = get_byte_range(headers, etag, stat)
+    except ValueError:
+        status, error_headers, body = error_response(416)
+        error_headers.append(("Content-Range", "bytes */{}".format(stat.st_size)))
+        return status, error_headers, body
+    start, end = byte_range or (0, body_stat.st_size - 1)
+
+    content = None
+    if file_cache is not None:
+        try:
+            content = file_cache.get(body_path, body_stat)
+        except OSError:
+            return error_response(404)
+
+    content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    response_headers += [
+        ("Content-Type", content_type),
+        ("Last-Modified", email.utils.formatdate(stat.st_mtime, usegmt=True)),
+    ]
+    if encoding:
+        response_headers.append(("Content-Encoding", encoding))
+    else:
+        response_headers.append(("Accept-Ranges", "bytes"))
+    status = 200
+    if byte_range:
+        status = 206
+        response_headers.append(
+            ("Content-Range", "bytes {}-{}/{}".format(start, end, stat.st_size))
+        )
+
+    if content is None:
+        return status, response_headers, (body_path, start, end + 1 - start)
+    return status, response_headers, content[start : end + 1]
+
+
+class CachingHTTPRequestHandler(SimpleHTTPRequestHandler):
+    """Request handler of the threaded engine, answering with get_response:
+    strong ETags, 304 Not Modified, precompressed files, byte ranges and
+    hot files served from memory
+
+    Attributes:
+        web_dir (pathlib.Path): the Home Documentation's site_dir, urls are
+            translated with translate_url
+        file_cache (FileCache): cache of the served files, None to always
+            read them from disk
+        endpoints (dict): routes answered by a function instead of a file,
+            called with the request's query parameters (see
+            urllib.parse.parse_qs) and returning the response's content
+            type and body
+        metrics (ServerMetrics): where answered requests are counted, None
+            not to count them
+        access_log (AccessLog): where answered requests are logged, None
+            not to log them
+        timeout (float): seconds to wait for a client before closing its
+            connection, so that idle connections don't hold the workers
+    """
+
+    timeout = SERVE_TIMEOUT
+    web_dir = None
+    file_cache = None
+    endpoints = {}
+    metrics = None
+    access_log = None
+
+    def setup(self):
+        super().setup()
+        if self.metrics is not None:
+            self.metrics.open_connection()
+
+    def finish(self):
+        super().finish()
+        if self.metrics is not None:
+            self.metrics.close_connection()
+
+    def handle_one_request(self):
+        start = time.monotonic()
+        self.status_code = None
+        self.body_size = 0
+        self.path = ""
+        super().handle_one_request()
+        if self.status_code is None:
+            return
+        duration = time.monotonic() - start
+        route = get_route_label(self.path, self.endpoints)
+        size = self.body_size if self.command != "HEAD" else 0
+        if self.metrics is not None:
+            self.metrics.observe_request(route, self.status_code, size, duration)
+        if self.access_log is not None:
+            self.access_log.log(
+                self.address_string(),
+                self.requestline,
+                self.status_code,
+                size,
+                duration,
+                route,
+            )
+
+    def log_message(self, format, *args):
+        # Requests are logged by handle_one_request, to the access log
+        pass
+
+    def send_response(self, code, message=None):
+        self.status_code = code
+        super().send_response(code, message)
+
+    def send_header(self, keyword, value):
+        if keyword.lower() == "content-length":
+            self.body_size = int(value)
+        super().send_header(keyword, value)
+
+    def translate_path(self, path):
+        return translate_url(self.web_dir, path)
+
+    def send_head(self):
+        response = get_response(
+            self.path, self.headers, self.web_dir, self.file_cache, self.endpoints
+        )
+        if response is None:
+            # Let the parent class list the directory
+            return super().send_head()
+        status, headers, body = response
+
+        if isinstance(body, tuple):
+            try:
+                f = FileRegion(*body)
+            except OSError:
+                status, headers, body = error_response(404)
+        if not isinstance(body, tuple):
+            f = io.BytesIO(body)
+
+        self.send_response(status)
+        for keyword, value in headers:
+            self.send_header(keyword, value)
+        if status != 304:
+            length = body[2] if isinstance(body, tuple) else len(body)
+            self.send_header("Content-Length", str(length))
+        self.end_headers()
+        if status == 304:
+            f.close()
+            return None
+        return f
+
+    def copyfile(self, source, outputfile):
+        if isinstance(source, FileRegion):
+            source.send(self.connection, outputfile)
+            # Less than Content-Length was sent: the connection is unusable
+            if source.length > 0:
+                self.close_connection = True
+        else:
+            super().copyfile(source, outputfile)
+
+
+class AsyncHTTPServer:
+    """Static file server built on asyncio, an alternative to PooledHTTPServer
+    for many concurrent readers: a single thread serves every connection,
+    connections are kept alive (HTTP/1.1) and files are sent with
+    sendfile(2) instead of being copied through Python buffers.
+
+    Responses are found by get_response, like CachingHTTPRequestHandler's,
+    in the loop's executor since they may read the disk. Directories
+    without an index are not listed. Only GET and HEAD are supported.
+
+    Args:
+        server_address (tuple(str, int)): host and port to bind
+        handler_class (type): a CachingHTTPRequestHandler subclass whose
+            web_dir, file_cache, endpoints, metrics and access_log are used
+        backlog (int, optional): Defaults to conf.SERVE_BACKLOG. Maximum
+            number of connections waiting to be accepted
+    """
+
+    def __init__(self, server_address, handler_class, backlog=SERVE_BACKLOG):
+        self.handler_class = handler_class
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.socket.bind(server_address)
+            self.socket.listen(backlog)
+        except OSError:
+            self.socket.close()
+            raise
+        self.server_address = self.socket.getsockname()
+        self.loop = None
+
+    def serve_forever(self):
+        """Serve until server_close is called
+        """
+        import asyncio
+
+        self.loop = asyncio.new_event_loop()
+        server = self.loop.run_until_complete(
+            asyncio.start_server(self.handle, sock=self.socket)
+        )
+        try:
+            self.loop.run_until_complete(server.serve_forever())
+        except asyncio.CancelledError:
+            pass
+
+    def server_close(self):
+        """Stop serving and close the listening socket
+        """
+        if self.loop is not None and self.loop.is_running():
+            import asyncio
+
+            for task in asyncio.all_tasks(self.loop):
+                self.loop.call_soon_threadsafe(task.cancel)
+        else:
+            self.socket.close()
+
+    async def handle(self, reader, writer):
+        import asyncio
+
+        client = writer.get_extra_info("peername")
+        # Headers and bodies are written separately: without this the body
+        # waits for the client to acknowledge the headers, ~40ms on Linux
+        sock = writer.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        metrics = self.handler_class.metrics
+        if metrics is not None:
+            metrics.open_connection()
+        try:
+            keep_alive = True
+            while keep_alive:
+                try:
+                    head = await asyncio.wait_for(
+                        reader.readuntil(b"\r\n\r\n"), KEEP_ALIVE_TIMEOUT
+                    )
+                except (
+                    asyncio.IncompleteReadError,
+                    asyncio.LimitOverrunError,
+                    asyncio.TimeoutError,
+                    ConnectionError,
+                ):
+                    break
+                keep_alive = await self.respond(head, writer, client)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+            if metrics is not None:
+                metrics.close_connection()
+
+    async def respond(self, head, writer, client):
+        """Answer a request
+
+        Args:
+            head (bytes): the request line and headers
+            writer (asyncio.StreamWriter): the connection
+            client (tuple): the client's address
+
+        Returns:
+            bool: whether to keep the connection alive
+        """
+        start = time.monotonic()
+        request_line, _, raw_headers = head.partition(b"\r\n")
+        request_line = request_line.decode("latin-1")
+        headers = http.client.parse_headers(io.BytesIO(raw_headers))
+        try:
+            method, target, version = request_line.split()
+        except ValueError:
+            method, target, version = "", "", "HTTP/1.0"
+
+        connection = headers.get("Connection", "").lower()
+        if version == "HTTP/1.1":
+            keep_alive = connection != "close"
+        else:
+            keep_alive = connection == "keep-alive"
+        # Request bodies are not read: don't reuse the connection
+        if headers.get("Content-Length", "0") != "0":
+            keep_alive = False
+
+        if not target.startswith("/"):
+            status, response_headers, body = error_response(400)
+        elif method not in ("GET", "HEAD"):
+            status, response_headers, body = error_response(501)
+        else:
+            # Stats, cache misses and endpoints block: keep them off the loop
+            handler_class = self.handler_class
+            response = await self.loop.run_in_executor(
+                None,
+                get_response,
+                target,
+                headers,
+                handler_class.web_dir,
+                handler_class.file_cache,
+                handler_class.endpoints,
+            )
+            status, response_headers, body = response or error_response(404)
+        region = None
+        if isinstance(body, tuple) and method != "HEAD" and status != 304:
+            # Opened before the head is sent, a rebuild may have removed it
+            try:
+                region = await self.loop.run_in_executor(None, FileRegion, *body)
+            except OSError:
+                status, response_headers, body = error_response(404)
+
+        size = body[2] if isinstance(body, tuple) else len(body)
+        lines = ["HTTP/1.1 {} {}".format(status, HTTPStatus(status).phrase)]
+        lines.append("Server: metadocs/{}".format(__VERSION__))
+        lines.append("Date: {}".format(email.utils.formatdate(usegmt=True)))
+        lines += ["{}: {}".format(k, v) for k, v in response_headers]
+        if status != 304:
+            lines.append("Content-Length: {}".format(size))
+        lines.append("Connection: {}".format("keep-alive" if keep_alive else "close"))
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+
+        if region is not None:
+            with region.file:
+                await writer.drain()
+                sent = await self.loop.sendfile(
+                    writer.transport, region.file, region.offset, region.length
+                )
+            # Less than Content-Length was sent: the connection is unusable
+            if sent < region.length:
+                keep_alive = False
+        elif method != "HEAD" and status != 304:
+            writer.write(body)
+        await writer.drain()
+
+        duration = time.monotonic() - start
+        route = get_route_label(target, self.handler_class.endpoints)
+        if method == "HEAD" or status == 304:
+            size = 0
+        metrics = self.handler_class.metrics
+        if metrics is not None:
+            metrics.observe_request(route, status, size, duration)
+        access_log = self.handler_class.access_log
+        if access_log is not None:
+            access_log.log(
+                client[0] if client else "-",
+                request_line,
+                status,
+                size,
+                duration,
+                route,
+            )
+        return keep_alive
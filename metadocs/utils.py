@@ -14,19 +14,60 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+import bisect
+import collections
+import contextlib
+import cProfile
+import datetime
 import fnmatch
+import gzip
+import hashlib
+import io
 import json
+import multiprocessing
 import os
 import re
+import signal
 import subprocess
+import sys
+import threading
+import time
+import traceback
 from pathlib import Path
-from shutil import copyfile
-
-from watchdog.events import PatternMatchingEventHandler
-
-from .conf import HTML_LOCATION, NEW_HOME_LINK, PROJECT_KEY, TO_REPLACE_WITH_HOME
-
-from ruamel.yaml import YAML
+from shutil import copyfile, rmtree
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from .conf import (
+    __VERSION__,
+    BUILD_MANIFEST,
+    COMPRESS_MIN_SIZE,
+    COMPRESSED_SIDECARS,
+    COMPRESSIBLE_SUFFIXES,
+    DEBOUNCE,
+    HTML_LOCATION,
+    METADOCS_DIR,
+    NEW_HOME_LINK,
+    PROJECT_KEY,
+    SEARCH_INDEX,
+    SEARCH_LIMIT,
+    SEARCH_PARTIAL,
+    SEARCH_WEIGHTS,
+    THEME_DIRS,
+    TO_REPLACE_WITH_HOME,
+)
+
+
+# Target of the Home Documentation's rebuilds, its route
+HOME_TARGET = "/"
 
 
 class colors:
@@ -94,118 +135,1849 @@ def overwrite_view_source(project, dir_path):
         for i, l in enumerate(html):
             if TO_REPLACE_WITH_HOME in l:
                 html[i] = NEW_HOME_LINK
+                # Only rewrite updated files, keeping the others' mtime
+                with open(html_file, "w") as f:
+                    f.writelines(html)
                 break
-        with open(html_file, "w") as f:
-            f.writelines(html)
 
 
-def get_listed_projects():
+def get_peak_rss():
+    """Peak resident set size of this process, since it started or since
+    the last reset_peak_rss
+
+    Returns:
+        int: bytes, None if unknown on this platform
+    """
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def reset_peak_rss():
+    """Reset this process's peak resident set size to its current one, on
+    Linux only
+
+    Returns:
+        bool: whether it was reset
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def get_cpu_time():
+    """CPU time of this process and of its terminated children, e.g. the
+    make or sphinx-build commands of projects with a custom Makefile
+
+    Returns:
+        float: seconds
+    """
+    cpu = time.process_time()
+    if resource is not None:
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        cpu += children.ru_utime + children.ru_stime
+    return cpu
+
+
+class BuildProfiler:
+    """Records the wall time, CPU time and peak RSS of a build's stages, and
+    optionally profiles them with cProfile. Stages may be nested, only the
+    outermost ones are profiled with cProfile. The CPU time includes the
+    stage's subprocesses. The peak RSS, if measured, is the one of the
+    process running the stage, during the stage on Linux, where the peak is
+    reset when a stage starts, and since the process started elsewhere.
+
+    Args:
+        cprofile_dir (pathlib.Path, optional): Defaults to None. Directory
+            to dump the stages' cProfile stats to, None not to profile them
+        peak_rss (bool, optional): Defaults to False. Whether to measure the
+            stages' peak RSS, which resets the process's own
+    """
+
+    def __init__(self, cprofile_dir=None, peak_rss=False):
+        self.cprofile_dir = cprofile_dir
+        self.peak_rss = peak_rss
+        self.stages = []
+        self.profiling = False
+        self.running = []
+
+    def start(self, name, project=None, profile=True):
+        """Start a stage
+
+        Args:
+            name (str): the stage
+            project (str, optional): Defaults to None. The project it builds
+            profile (bool, optional): Defaults to True. Whether to profile
+                it with cProfile, if the profiler does, so that its nested
+                stages are profiled instead
+
+        Returns:
+            dict: the running stage, to stop
+        """
+        stage = {"stage": name, "project": project, "profile": None}
+        if self.cprofile_dir is not None and profile and not self.profiling:
+            self.profiling = True
+            stage["profile"] = cProfile.Profile()
+            stage["profile"].enable()
+        stage["peak_rss"] = None
+        if self.peak_rss:
+            # The running stages keep their peak, the new one starts from now
+            self._update_peaks()
+            reset_peak_rss()
+            stage["peak_rss"] = get_peak_rss()
+        self.running.append(stage)
+        stage["wall"] = time.perf_counter()
+        stage["cpu"] = get_cpu_time()
+        return stage
+
+    def _update_peaks(self):
+        if not self.peak_rss:
+            return
+        peak = get_peak_rss()
+        if peak is None:
+            return
+        for stage in self.running:
+            stage["peak_rss"] = max(stage["peak_rss"] or 0, peak)
+
+    def stop(self, stage):
+        """Stop a stage and record it
+
+        Args:
+            stage (dict): the stage, from start
+        """
+        wall = time.perf_counter() - stage["wall"]
+        cpu = get_cpu_time() - stage["cpu"]
+        self._update_peaks()
+        self.running.remove(stage)
+        profile = stage["profile"]
+        if profile is not None:
+            profile.disable()
+            self.profiling = False
+            self.cprofile_dir.mkdir(parents=True, exist_ok=True)
+            name = stage["stage"]
+            if stage["project"]:
+                name += "-" + stage["project"]
+            profile.dump_stats(str(self.cprofile_dir / (name + ".prof")))
+        self.stages.append(
+            {
+                "stage": stage["stage"],
+                "project": stage["project"],
+                "wall": wall,
+                "cpu": cpu,
+                "peak_rss": stage["peak_rss"],
+            }
+        )
+
+    @contextlib.contextmanager
+    def stage(self, name, project=None):
+        """Record a stage, as a context manager
+
+        Args:
+            name (str): the stage
+            project (str, optional): Defaults to None. The project it builds
+        """
+        stage = self.start(name, project)
+        try:
+            yield
+        finally:
+            self.stop(stage)
+
+    def watch_sphinx(self, app, project):
+        """Record the reading and writing stages of a sphinx build
+
+        Args:
+            app (sphinx.application.Sphinx): the application, not built yet
+            project (str): the project it builds
+        """
+        running = {}
+
+        def read(app, env, docnames):
+            running["read"] = self.start("sphinx-read", project)
+
+        def write(app, env):
+            if "read" in running:
+                self.stop(running.pop("read"))
+            running["write"] = self.start("sphinx-write", project)
+
+        def finish(app, exception):
+            for stage in running.values():
+                self.stop(stage)
+            running.clear()
+
+        app.connect("env-before-read-docs", read)
+        app.connect("env-updated", write)
+        app.connect("build-finished", finish)
+
+    def summary(self):
+        """Format the stages as a table
+
+        Returns:
+            str: the table
+        """
+        rows = [("Stage", "Project", "Wall (s)", "CPU (s)", "Peak RSS (MB)")]
+        for s in self.stages:
+            peak_rss = s["peak_rss"]
+            rows.append(
+                (
+                    s["stage"],
+                    s["project"] or "",
+                    "{:.3f}".format(s["wall"]),
+                    "{:.3f}".format(s["cpu"]),
+                    "" if peak_rss is None else "{:.1f}".format(peak_rss / 2 ** 20),
+                )
+            )
+        widths = [max(len(r[i]) for r in rows) for i in range(len(rows[0]))]
+        lines = []
+        for i, row in enumerate(rows):
+            cells = [
+                c.ljust(w) if j < 2 else c.rjust(w)
+                for j, (c, w) in enumerate(zip(row, widths))
+            ]
+            lines.append("  ".join(cells).rstrip())
+            if i == 0:
+                lines.append("  ".join("-" * w for w in widths))
+        return "\n".join(lines)
+
+    def save(self, path):
+        """Write the stages to a JSON report
+
+        Args:
+            path (pathlib.Path): the report's path
+        """
+        path.parent.mkdir(parents=True, exist_ok=True)
+        report = {
+            "date": datetime.datetime.now().astimezone().isoformat(),
+            "version": __VERSION__,
+            "stages": self.stages,
+        }
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+def has_custom_makefile(project_path):
+    """Whether the project's Makefile does more than the one
+    sphinx-quickstart generates, i.e. forwarding targets to
+    `sphinx-build -M` from source/ to build/ without extra options
+
+    Args:
+        project_path (pathlib.Path): the project's directory
+
+    Returns:
+        bool: True if the build should go through `make html`
+    """
+    makefile = project_path / "Makefile"
+    if not makefile.exists():
+        return False
+
+    with open(makefile, "r") as f:
+        lines = f.readlines()
+
+    variables = {}
+    for l in lines:
+        if "=" in l and not l.startswith(("\t", "#")):
+            key, value = l.split("=", 1)
+            variables[key.strip().rstrip("?:")] = value.strip()
+
+    return not (
+        any('-M $@ "$(SOURCEDIR)" "$(BUILDDIR)"' in l for l in lines)
+        and variables.get("SOURCEDIR") == "source"
+        and variables.get("BUILDDIR") == "build"
+        and not variables.get("SPHINXOPTS")
+    )
+
+
+def make_sphinx_project(project_path, clean=True):
+    """Build a sphinx project with its Makefile, capturing its output
+    instead of letting it interleave with other projects' builds
+
+    Args:
+        project_path (pathlib.Path): the project's directory
+        clean (bool, optional): Defaults to True. Whether to run
+            `make clean` before `make html`
+
+    Returns:
+        tuple(int, str, str): exit status, stdout and stderr of the build
+    """
+    command = "make clean && make html" if clean else "make html"
+    process = subprocess.run(
+        command,
+        shell=True,
+        cwd=str(project_path),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    return process.returncode, process.stdout, process.stderr
+
+
+def create_sphinx_application(project_path, status, warning, clean=True):
+    """Create a sphinx application building a project's html the way
+    `make html` would: source/ is built into build/html with doctrees
+    in build/doctrees
+
+    Args:
+        project_path (pathlib.Path): the project's directory
+        status (io.TextIOBase): stream for sphinx's output
+        warning (io.TextIOBase): stream for sphinx's warnings
+        clean (bool, optional): Defaults to True. Whether to delete the
+            build/ directory first and ignore any saved environment
+
+    Returns:
+        sphinx.application.Sphinx: the application, ready to build
+    """
+    from sphinx.application import Sphinx
+    from sphinx.util.console import color_terminal, nocolor
+
+    if not color_terminal():
+        nocolor()
+
+    source_path = project_path / "source"
+    build_path = project_path / "build"
+    if clean:
+        rmtree(str(build_path), ignore_errors=True)
+
+    return Sphinx(
+        str(source_path),
+        str(source_path),
+        str(build_path / "html"),
+        str(build_path / "doctrees"),
+        "html",
+        status=status,
+        warning=warning,
+        freshenv=clean,
+    )
+
+
+def run_sphinx_project(project_path, clean=True, profiler=None):
+    """Build a sphinx project's html from within this process, so that sphinx
+    and its extensions are only imported once for all the projects built
+    by this process.
+
+    Modules imported from the project (by its conf.py or autodoc) are
+    forgotten after the build so that the next project, or the next build
+    of this one, imports its own code afresh.
+
+    Args:
+        project_path (pathlib.Path): the project's directory
+        clean (bool, optional): Defaults to True. Whether to delete
+            the build/ directory first
+        profiler (BuildProfiler, optional): Defaults to None. Where to
+            record the build's stages
+
+    Returns:
+        tuple(int, str, str): exit status, stdout and stderr of the build
+    """
+    from sphinx.util.docutils import docutils_namespace
+
+    project_path = Path(project_path).resolve()
+    profiler = profiler or BuildProfiler()
+    status, warning = io.StringIO(), io.StringIO()
+    sys_path = list(sys.path)
+    try:
+        # Keep each project's docutils directives, roles and nodes apart
+        with docutils_namespace():
+            with profiler.stage("sphinx-setup", project_path.name):
+                app = create_sphinx_application(
+                    project_path, status, warning, clean
+                )
+            profiler.watch_sphinx(app, project_path.name)
+            app.build()
+            exit_status = app.statuscode
+    except Exception:
+        warning.write(traceback.format_exc())
+        exit_status = 1
+    finally:
+        sys.path[:] = sys_path
+        forget_modules(project_path)
+
+    return exit_status, status.getvalue(), warning.getvalue()
+
+
+def forget_modules(path):
+    """Remove modules imported from a directory from sys.modules
+
+    Args:
+        path (pathlib.Path): directory the modules were imported from
+    """
+    path = str(path) + os.sep
+    for name, module in list(sys.modules.items()):
+        module_file = getattr(module, "__file__", None)
+        if module_file and os.path.abspath(module_file).startswith(path):
+            del sys.modules[name]
+
+
+def build_sphinx_project(project_path, clean=True, profiler=None):
+    """Build a sphinx project in-process, or with `make html` if it
+    has a custom Makefile
+
+    Args:
+        project_path (pathlib.Path): the project's directory
+        clean (bool, optional): Defaults to True. Whether to start from
+            a clean build directory
+        profiler (BuildProfiler, optional): Defaults to None. Where to
+            record the in-process build's stages
+
+    Returns:
+        tuple(int, str, str): exit status, stdout and stderr of the build
+    """
+    if has_custom_makefile(project_path):
+        return make_sphinx_project(project_path, clean)
+    return run_sphinx_project(project_path, clean, profiler)
+
+
+def sphinx_worker(project_path, connection):
+    """Build a project each time a request comes through `connection`,
+    keeping its sphinx application in memory between builds. Runs in its
+    own process, started by SphinxDaemon.
+
+    Args:
+        project_path (pathlib.Path): the project's directory
+        connection (multiprocessing.connection.Connection): receives
+            whether to build from scratch, sends back exit status, stdout
+            and stderr of each build
+    """
+    # Lead a process group, so that cancelling a build also stops the make
+    # and sphinx-build processes of projects with a custom Makefile
+    if hasattr(os, "setpgid"):
+        os.setpgid(0, 0)
+    app = None
+    status, warning = io.StringIO(), io.StringIO()
+    while True:
+        try:
+            clean = connection.recv()
+        except EOFError:
+            return
+
+        if has_custom_makefile(project_path):
+            app = None
+            connection.send(make_sphinx_project(project_path, clean))
+            continue
+
+        for stream in (status, warning):
+            stream.seek(0)
+            stream.truncate()
+        try:
+            if clean or app is None:
+                app = create_sphinx_application(project_path, status, warning, clean)
+            app.build()
+            exit_status = app.statuscode
+        except Exception:
+            # Start over with a fresh application next time
+            app = None
+            warning.write(traceback.format_exc())
+            exit_status = 1
+        finally:
+            # Have autodoc import the documented code's latest version
+            forget_modules(project_path)
+
+        connection.send((exit_status, status.getvalue(), warning.getvalue()))
+
+
+class SphinxDaemon:
+    """Keeps one sphinx application per project in memory while serving, so
+    that rebuilding a project only re-reads and re-writes the documents which
+    changed. Applications are re-created when a project's conf.py or theme
+    changes. Projects with a custom Makefile are built with `make html`.
+
+    Each project's application lives in its own worker process, so projects
+    can be built in parallel and a running build can be cancelled.
+
+    Args:
+        dir_path (pathlib.Path): the Home Documentation's path
+    """
+
+    def __init__(self, dir_path):
+        self.dir_path = Path(dir_path).resolve()
+        self.workers = {}
+        # Guards the workers and the build manifest
+        self.lock = threading.Lock()
+
+    def build(self, project, clean=False):
+        """Build a project if its inputs changed since its last build,
+        update the build manifest and the project's link to the
+        Documentation's Home
+
+        Args:
+            project (str): the project to build
+            clean (bool, optional): Defaults to False. Force a clean build
+
+        Returns:
+            tuple(int, str, str): exit status, stdout and stderr of the build.
+                The exit status is None if the build was cancelled.
+        """
+        project_path = self.dir_path / project
+        hashes = hash_project_inputs(project_path)
+        with self.lock:
+            manifest = load_build_manifest(self.dir_path)
+        mode = (
+            "clean"
+            if clean
+            else get_build_mode(
+                manifest.get(project), hashes, project_path / HTML_LOCATION
+            )
+        )
+        if mode == "skip":
+            return 0, "", ""
+
+        result = self._request(project, mode == "clean")
+        if result[0] is None:
+            return result
+
+        with self.lock:
+            # Reload the manifest: other projects may have been built meanwhile
+            manifest = load_build_manifest(self.dir_path)
+            if result[0] == 0:
+                manifest[project] = hashes
+            else:
+                manifest.pop(project, None)
+            save_build_manifest(self.dir_path, manifest)
+
+        overwrite_view_source(project, self.dir_path)
+        compress_directory(project_path / HTML_LOCATION)
+        return result
+
+    def cancel(self, project):
+        """Stop a project's running build, if any, along with the processes
+        it started. Its next build will start a new worker.
+
+        Args:
+            project (str): the project whose build to cancel
+        """
+        with self.lock:
+            worker = self.workers.pop(project, None)
+        if worker is None:
+            return
+        try:
+            # The worker leads its process group, see sphinx_worker
+            os.killpg(worker[0].pid, signal.SIGTERM)
+        except (AttributeError, OSError):
+            # Not leading it yet, or no process groups
+            worker[0].terminate()
+
+    def close(self):
+        """Stop all workers
+        """
+        for project in list(self.workers):
+            self.cancel(project)
+
+    def _request(self, project, clean):
+        with self.lock:
+            worker = self.workers.get(project)
+            if worker is None or not worker[0].is_alive():
+                context = multiprocessing.get_context("spawn")
+                connection, worker_connection = context.Pipe()
+                process = context.Process(
+                    target=sphinx_worker,
+                    args=(self.dir_path / project, worker_connection),
+                )
+                process.daemon = True
+                process.start()
+                # Only the worker holds its end, so that its death is an EOF
+                worker_connection.close()
+                worker = self.workers[project] = (process, connection)
+
+        try:
+            worker[1].send(clean)
+            return worker[1].recv()
+        except (EOFError, OSError):
+            with self.lock:
+                if self.workers.get(project) is worker:
+                    del self.workers[project]
+            return None, "", ""
+
+
+def hash_files(paths, root):
+    """Hash the content of files, along with their path relative to root
+    so that renamed or deleted files change the hash too
+
+    Args:
+        paths (iterable(pathlib.Path)): files to hash
+        root (pathlib.Path): the paths are hashed relative to it
+
+    Returns:
+        str: hex digest of the files
+    """
+    sha = hashlib.sha1()
+    for path in sorted(paths):
+        sha.update(str(path.relative_to(root)).encode())
+        with open(path, "rb") as f:
+            sha.update(f.read())
+    return sha.hexdigest()
+
+
+def hash_project_inputs(project_path):
+    """Compute content hashes of what a sphinx build depends on:
+        conf: the project's source/conf.py
+        theme: its templates, themes and static files
+        source: the rest of its source/ tree
+        package: the documented python files (outside of source/ and build/)
+
+    Args:
+        project_path (pathlib.Path): the project's directory
+
+    Returns:
+        dict: hashes of each kind of input
+    """
+    source_path = project_path / "source"
+    theme_paths = {source_path / d for d in THEME_DIRS}
+
+    theme_files, source_files, package_files = [], [], []
+    for root, dirs, filenames in os.walk(str(source_path)):
+        root = Path(root)
+        if root in theme_paths or any(p in theme_paths for p in root.parents):
+            theme_files += [root / f for f in filenames]
+        else:
+            source_files += [root / f for f in filenames if f != "conf.py"]
+
+    for root, dirs, filenames in os.walk(str(project_path)):
+        root = Path(root)
+        if root == project_path:
+            dirs[:] = [d for d in dirs if d not in {"source", "build"}]
+        dirs[:] = [d for d in dirs if not d.startswith(".") and d != "__pycache__"]
+        package_files += [root / f for f in filenames if f.endswith(".py")]
+
+    conf_path = source_path / "conf.py"
+    return {
+        "conf": hash_files([conf_path] if conf_path.exists() else [], project_path),
+        "theme": hash_files(theme_files, project_path),
+        "source": hash_files(source_files, project_path),
+        "package": hash_files(package_files, project_path),
+    }
+
+
+def get_build_mode(previous_hashes, hashes, html_path):
+    """Decide how a project should be built given its inputs' hashes
+    at its last successful build and now
+
+    Args:
+        previous_hashes (dict): hashes from the build manifest, or None
+        hashes (dict): current hashes, from hash_project_inputs
+        html_path (pathlib.Path): the project's built html directory
+
+    Returns:
+        str: "clean" if the configuration or theme changed (or the project
+            was never built), "incremental" if only sources or documented
+            files changed, "skip" if nothing changed
+    """
+    if not previous_hashes or not (html_path / "index.html").exists():
+        return "clean"
+    if any(previous_hashes.get(k) != hashes[k] for k in ("conf", "theme")):
+        return "clean"
+    if any(previous_hashes.get(k) != hashes[k] for k in ("source", "package")):
+        return "incremental"
+    return "skip"
+
+
+def load_build_manifest(dir_path):
+    """Load the Home Documentation's build manifest
+
+    Args:
+        dir_path (pathlib.Path): the Home Documentation's path
+
+    Returns:
+        dict: projects' input hashes at their last successful build
+    """
+    manifest_path = dir_path / METADOCS_DIR / BUILD_MANIFEST
+    try:
+        with open(manifest_path, "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def save_build_manifest(dir_path, manifest):
+    """Write the Home Documentation's build manifest
+
+    Args:
+        dir_path (pathlib.Path): the Home Documentation's path
+        manifest (dict): projects' input hashes
+    """
+    manifest_dir = dir_path / METADOCS_DIR
+    if not manifest_dir.exists():
+        manifest_dir.mkdir()
+    with open(manifest_dir / BUILD_MANIFEST, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+
+# Loaded mkdocs configurations: {mkdocs.yml path: (mtime, config)}
+_MKDOCS_CONFIGS = {}
+
+# Parsed files: {(path, parser): (mtime_ns, size, value)}
+_PARSED_FILES = {}
+_PARSED_FILES_LOCK = threading.Lock()
+
+
+def load_parsed(path, parse):
+    """Parse a file, or get its last parsed value if it did not change since:
+    files are only parsed again when their modification time or size change
+
+    Args:
+        path (pathlib.Path): the file
+        parse (function): parses the file's text
+
+    Returns:
+        the parsed value, shared by all callers: don't modify it
+    """
+    stat = path.stat()
+    key = (str(path), parse)
+    with _PARSED_FILES_LOCK:
+        cached = _PARSED_FILES.get(key)
+    if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+        return cached[2]
+
+    with open(path, "r") as f:
+        value = parse(f.read())
+    with _PARSED_FILES_LOCK:
+        _PARSED_FILES[key] = (stat.st_mtime_ns, stat.st_size, value)
+    return value
+
+
+def parse_yaml(text):
+    """Parse YAML with the safe loader, which is faster than the default
+    round-trip loader but drops comments. mkdocs.yml files using custom
+    tags (e.g. !!python/name) are parsed with the round-trip loader.
+
+    Args:
+        text (str): the YAML document
+
+    Returns:
+        the document's content
+    """
+    from ruamel.yaml import YAML, YAMLError
+
+    try:
+        return YAML(typ="safe").load(text)
+    except YAMLError:
+        return YAML().load(text)
+
+
+def get_mkdocs_yml(dir_path=None):
+    """Load the Home Documentation's mkdocs.yml as plain data, only parsing
+    it again when it changed. Use a round-trip YAML() loader instead to
+    edit the file while keeping its comments.
+
+    Args:
+        dir_path (pathlib.Path, optional): Defaults to the current
+            directory. The Home Documentation's path
+
+    Returns:
+        dict: the configuration, shared by all callers: don't modify it
+    """
+    config_path = (dir_path or Path().resolve()) / "mkdocs.yml"
+    return load_parsed(config_path, parse_yaml) or {}
+
+
+def get_docs_dir(dir_path=None):
+    """Get mkdocs's docs_dir
+
+    Args:
+        dir_path (pathlib.Path, optional): Defaults to the current
+            directory. The Home Documentation's path
+
+    Returns:
+        str: the docs_dir, relative to the Home Documentation
+    """
+    return get_mkdocs_yml(dir_path).get("docs_dir", "docs")
+
+
+def get_site_dir(dir_path=None):
+    """Get mkdocs's site_dir
+
+    Args:
+        dir_path (pathlib.Path, optional): Defaults to the current
+            directory. The Home Documentation's path
+
+    Returns:
+        str: the site_dir, relative to the Home Documentation
+    """
+    return get_mkdocs_yml(dir_path).get("site_dir", "site")
+
+
+def get_mkdocs_config(dir_path=None):
+    """Load the Home Documentation's mkdocs.yml as a mkdocs config object.
+    It is only loaded again if the file changed.
+
+    Args:
+        dir_path (pathlib.Path, optional): Defaults to the current
+            directory. The Home Documentation's path
+
+    Returns:
+        mkdocs config object
+    """
+    from mkdocs.config import load_config
+
+    config_path = (dir_path or Path().resolve()) / "mkdocs.yml"
+    mtime = config_path.stat().st_mtime
+    cached = _MKDOCS_CONFIGS.get(str(config_path))
+    if cached is None or cached[0] != mtime:
+        config = load_config(config_file=str(config_path))
+        # mkdocs >= 1.4 plugins expect to be started before building
+        if hasattr(config["plugins"], "on_startup"):
+            config["plugins"].on_startup(command="build", dirty=False)
+        cached = _MKDOCS_CONFIGS[str(config_path)] = (mtime, config)
+    return cached[1]
+
+
+def build_home_documentation(dir_path=None, verbose=False):
+    """Build the Home Documentation with mkdocs, from within this process
+
+    Args:
+        dir_path (pathlib.Path, optional): Defaults to the current
+            directory. The Home Documentation's path
+        verbose (bool, optional): Defaults to False. Whether to print
+            mkdocs's info logs and not only its warnings
+
+    Returns:
+        bool: whether the build succeeded
+    """
+    import logging
+    from mkdocs.commands.build import build
+
+    logger = logging.getLogger("mkdocs")
+    if not logger.handlers:
+        logger.addHandler(logging.StreamHandler())
+    logger.setLevel(logging.INFO if verbose else logging.WARNING)
+
+    try:
+        build(get_mkdocs_config(dir_path))
+    except Exception as e:
+        print(
+            "{}Building the Home Documentation failed:{} {}".format(
+                colors.FAIL, colors.ENDC, e
+            )
+        )
+        return False
+    return True
+
+
+def compress_directory(directory):
+    """Write precompressed copies of a built directory's compressible
+    files next to them: file.gz, and file.br if brotli is installed, which
+    serve sends to the clients accepting them. Small files and files whose
+    copies are up to date are skipped.
+
+    Args:
+        directory (pathlib.Path or str): the built directory
+    """
+    for root, _, filenames in os.walk(str(directory)):
+        for filename in filenames:
+            if os.path.splitext(filename)[1] not in COMPRESSIBLE_SUFFIXES:
+                continue
+            path = os.path.join(root, filename)
+            stat = os.stat(path)
+            if stat.st_size < COMPRESS_MIN_SIZE:
+                continue
+
+            content = None
+            for encoding, suffix in COMPRESSED_SIDECARS:
+                if encoding == "br" and brotli is None:
+                    continue
+                try:
+                    if os.stat(path + suffix).st_mtime_ns >= stat.st_mtime_ns:
+                        continue
+                except OSError:
+                    pass
+
+                if content is None:
+                    with open(path, "rb") as f:
+                        content = f.read()
+                if encoding == "br":
+                    compressed = brotli.compress(content)
+                else:
+                    compressed = gzip.compress(content, mtime=0)
+                with open(path + suffix, "wb") as f:
+                    f.write(compressed)
+
+
+def tokenize(text):
+    """Split a text into the lowercase words searches look for
+
+    Args:
+        text (str): the text, html tags are ignored
+
+    Returns:
+        list(str): the words
+    """
+    return re.findall(r"\w+", re.sub(r"<[^>]*>", " ", text).lower())
+
+
+# Stemmers keep state between calls: each thread gets its own
+_stemmers = threading.local()
+
+
+def stem(word):
+    """Reduce a word to the stem sphinx indexes it under, with the English
+    stemmer of the installed sphinx version
+
+    Args:
+        word (str): the word
+
+    Returns:
+        str: its stem
+    """
+    stemmer = getattr(_stemmers, "stemmer", None)
+    if stemmer is None:
+        from sphinx.search.en import SearchEnglish
+
+        stemmer = _stemmers.stemmer = SearchEnglish({})
+    return stemmer.stem(word)
+
+
+def parse_sphinx_search_index(text):
+    """Parse the searchindex.js file sphinx writes in a built project
+
+    Args:
+        text (str): the file's text: Search.setIndex({...})
+
+    Returns:
+        dict: the index
+    """
+    return json.loads(text[text.index("(") + 1 : text.rindex(")")])
+
+
+class SearchIndexWriter:
+    """Merge search indexes into one, where a term points to the pages and
+    anchors it appears in with a weight: the sum of the weights of the
+    places it appears in (SEARCH_WEIGHTS). Words are stemmed, as sphinx
+    stores them (see stem), object names are kept whole
+    """
+
+    def __init__(self):
+        self.projects = []
+        self.pages = []
+        self.anchors = {"": 0}
+        self.terms = collections.defaultdict(dict)
+
+    def add_page(self, project, path, title):
+        """Add a page to the index
+
+        Args:
+            project (str): the page's project, HOME_TARGET for the Home
+                Documentation
+            path (str): the page's url path
+            title (str): the page's title
+
+        Returns:
+            int: the page's index
+        """
+        if not self.projects or self.projects[-1] != project:
+            self.projects.append(project)
+        self.pages.append([len(self.projects) - 1, path, title])
+        return len(self.pages) - 1
+
+    def add_terms(self, terms, page, anchor, weight):
+        """Index terms appearing in a page
+
+        Args:
+            terms (iterable(str)): the terms
+            page (int): the page's index
+            anchor (str): where the terms are in the page, "" for the page
+            weight (float): their weight there
+        """
+        anchor = self.anchors.setdefault(anchor or "", len(self.anchors))
+        for term in terms:
+            entries = self.terms[term]
+            entries[page, anchor] = entries.get((page, anchor), 0) + weight
+
+    def add_sphinx_project(self, project, index):
+        """Index a sphinx project's pages
+
+        Args:
+            project (str): the project's name, its route
+            index (dict): its searchindex.js, see parse_sphinx_search_index
+        """
+        pages = [
+            self.add_page(project, "/{}/{}.html".format(project, docname), title)
+            for docname, title in zip(index["docnames"], index["titles"])
+        ]
+
+        def doc_indexes(docs):
+            return [docs] if isinstance(docs, int) else docs
+
+        for term, docs in index["terms"].items():
+            for doc in doc_indexes(docs):
+                self.add_terms([term.lower()], pages[doc], "", SEARCH_WEIGHTS["text"])
+        for term, docs in index["titleterms"].items():
+            for doc in doc_indexes(docs):
+                self.add_terms([term.lower()], pages[doc], "", SEARCH_WEIGHTS["title"])
+        for title, locations in index.get("alltitles", {}).items():
+            for doc, anchor in locations:
+                if anchor:
+                    terms = {stem(word) for word in tokenize(title)}
+                    self.add_terms(terms, pages[doc], anchor, SEARCH_WEIGHTS["section"])
+
+        objnames = index.get("objnames", {})
+        for prefix, objects in index.get("objects", {}).items():
+            # Sphinx < 6 maps names to [doc, type, priority, anchor]
+            if isinstance(objects, dict):
+                objects = [values + [name] for name, values in objects.items()]
+            for doc, objtype, priority, anchor, name in objects:
+                if priority < 0:
+                    continue
+                fullname = "{}.{}".format(prefix, name) if prefix else name
+                if anchor == "":
+                    anchor = fullname
+                elif anchor == "-":
+                    anchor = "{}-{}".format(objnames[str(objtype)][1], fullname)
+                terms = {name.lower(), fullname.lower()}
+                self.add_terms(terms, pages[doc], anchor, SEARCH_WEIGHTS["object"])
+
+    def add_mkdocs_site(self, index):
+        """Index the Home Documentation's pages
+
+        Args:
+            index (dict): its site's search/search_index.json
+        """
+        pages = {}
+        for doc in index["docs"]:
+            location, _, anchor = doc["location"].partition("#")
+            if location not in pages:
+                pages[location] = self.add_page(
+                    HOME_TARGET, "/" + location, doc["title"]
+                )
+            page = pages[location]
+            title_weight = SEARCH_WEIGHTS["section" if anchor else "title"]
+            title_terms = {stem(word) for word in tokenize(doc["title"])}
+            self.add_terms(title_terms, page, anchor, title_weight)
+            text_terms = {stem(word) for word in tokenize(doc["text"])}
+            self.add_terms(text_terms, page, anchor, SEARCH_WEIGHTS["text"])
+
+    def to_dict(self):
+        """Compact representation of the index: projects, pages and anchors
+        are listed once and referred to by their index. Terms are sorted,
+        each one mapped to a flat list of (page, anchor, weight) entries.
+
+        Returns:
+            dict: the index
+        """
+        anchors = sorted(self.anchors, key=self.anchors.get)
+        terms = {}
+        for term in sorted(self.terms):
+            entries = terms[term] = []
+            for (page, anchor), weight in self.terms[term].items():
+                entries += [page, anchor, weight]
+        return {
+            "version": 2,
+            "projects": self.projects,
+            "pages": self.pages,
+            "anchors": anchors,
+            "terms": terms,
+        }
+
+
+def write_search_index(dir_path=None):
+    """Merge the search indexes of the projects listed in the Home
+    Documentation and of its site into SEARCH_INDEX, in its site_dir.
+    Indexes are only parsed again if they changed since the last merge.
+
+    Args:
+        dir_path (pathlib.Path, optional): Defaults to the current
+            directory. The Home Documentation's path
+
+    Returns:
+        pathlib.Path: the merged index's path
+    """
+    dir_path = dir_path or Path().resolve()
+    site_path = dir_path / get_site_dir(dir_path)
+    writer = SearchIndexWriter()
+
+    mkdocs_index = site_path / "search" / "search_index.json"
+    if mkdocs_index.exists():
+        writer.add_mkdocs_site(load_parsed(mkdocs_index, json.loads))
+    for project in sorted(p.strip("/") for p in get_listed_projects(dir_path)):
+        sphinx_index = dir_path / project / HTML_LOCATION / "searchindex.js"
+        if sphinx_index.exists():
+            writer.add_sphinx_project(
+                project, load_parsed(sphinx_index, parse_sphinx_search_index)
+            )
+
+    # Replaced at once: serve may be reading it
+    index_path = site_path / SEARCH_INDEX
+    index_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = index_path.with_name(index_path.name + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(writer.to_dict(), f, separators=(",", ":"))
+    os.replace(tmp_path, index_path)
+    return index_path
+
+
+class SearchIndex:
+    """Search index written by write_search_index, queried by serve
+
+    Args:
+        index (dict): the index, see SearchIndexWriter.to_dict
+    """
+
+    def __init__(self, index):
+        self.projects = index["projects"]
+        self.pages = index["pages"]
+        self.anchors = index["anchors"]
+        self.terms = list(index["terms"])
+        self.entries = list(index["terms"].values())
+
+    @classmethod
+    def load(cls, dir_path=None):
+        """Get a Home Documentation's search index, parsed again only when
+        it changed
+
+        Args:
+            dir_path (pathlib.Path, optional): Defaults to the current
+                directory. The Home Documentation's path
+
+        Returns:
+            SearchIndex: the index, None if it was never built
+        """
+        dir_path = dir_path or Path().resolve()
+        index_path = dir_path / get_site_dir(dir_path) / SEARCH_INDEX
+        try:
+            return load_parsed(index_path, cls.parse)
+        except FileNotFoundError:
+            return None
+
+    @classmethod
+    def parse(cls, text):
+        return cls(json.loads(text))
+
+    def search(self, query, limit=SEARCH_LIMIT):
+        """Find the pages containing all of a query's words: their stems,
+        whole object names, or terms either is a prefix of
+
+        Args:
+            query (str): the query
+            limit (int, optional): Defaults to SEARCH_LIMIT. Maximum number
+                of results
+
+        Returns:
+            list(dict): the best results first: their project, title, url
+                and score
+        """
+        # Page: [score, {anchor: score}]
+        matches = None
+        for word in set(tokenize(query)):
+            # Page: {anchor: weight}
+            word_matches = collections.defaultdict(dict)
+            word_stem = stem(word)
+            # Terms starting with the word or its stem ("happy": "happi")
+            prefix = os.path.commonprefix([word, word_stem])
+            i = bisect.bisect_left(self.terms, prefix)
+            while i < len(self.terms) and self.terms[i].startswith(prefix):
+                term = self.terms[i]
+                if term in (word, word_stem):
+                    factor = 1
+                elif term.startswith((word, word_stem)):
+                    factor = SEARCH_PARTIAL
+                else:
+                    i += 1
+                    continue
+                entries = self.entries[i]
+                for j in range(0, len(entries), 3):
+                    page, anchor, weight = entries[j : j + 3]
+                    anchors = word_matches[page]
+                    anchors[anchor] = max(anchors.get(anchor, 0), weight * factor)
+                i += 1
+
+            if matches is None:
+                matches = {
+                    page: [max(anchors.values()), dict(anchors)]
+                    for page, anchors in word_matches.items()
+                }
+                continue
+            for page in list(matches):
+                anchors = word_matches.get(page)
+                if anchors is None:
+                    del matches[page]
+                    continue
+                matches[page][0] += max(anchors.values())
+                page_anchors = matches[page][1]
+                for anchor, weight in anchors.items():
+                    page_anchors[anchor] = page_anchors.get(anchor, 0) + weight
+
+        best = sorted((matches or {}).items(), key=lambda m: (-m[1][0], m[0]))
+        results = []
+        for page, (score, anchors) in best[:limit]:
+            project, path, title = self.pages[page]
+            # The best anchor, the page itself if it is as good
+            anchor = max(anchors, key=lambda a: (anchors[a], a == 0))
+            if anchor:
+                path = "{}#{}".format(path, self.anchors[anchor])
+            results.append(
+                {
+                    "project": self.projects[project],
+                    "title": title,
+                    "url": path,
+                    "score": score,
+                }
+            )
+        return results
+
+
+def get_listed_projects(dir_path=None):
     """Find the projects listed in the Home Documentation's
     index.md file
 
+    Args:
+        dir_path (pathlib.Path, optional): Defaults to the current
+            directory. The Home Documentation's path
+
     Returns:
         set(str): projects' names, with the '/' in their beginings
     """
-    yaml = YAML()
-    mkdocs_yml = yaml.load(open(Path().resolve() / 'mkdocs.yml'))
-    docs_dir = mkdocs_yml['docs_dir'] if 'docs_dir' in mkdocs_yml else 'docs'
-    index_path = Path().resolve() / docs_dir / "index.md"
-    with open(index_path, "r") as index_file:
-        lines = index_file.readlines()
+    dir_path = dir_path or Path().resolve()
+    index_path = dir_path / get_docs_dir(dir_path) / "index.md"
+    return set(load_parsed(index_path, parse_listed_projects))
+
+
+def parse_listed_projects(text):
+    """Find the projects listed in the Projects section of an index.md file
+
+    Args:
+        text (str): the index.md file's content
+
+    Returns:
+        frozenset(str): projects' names, with the '/' in their beginings
+    """
+    section = parse_projects_section(text.splitlines(True))
+    return frozenset(p.link for p in section.projects)
+
+
+# A project listed in index.md: its link's text, link and description, and
+# the span of its lines [start, end), including its description's wrapped
+# lines
+ListedProject = collections.namedtuple(
+    "ListedProject", ["name", "link", "description", "start", "end"]
+)
+
+# index.md's Projects section: the span of its lines [start, end), from its
+# title to the next title, and its projects
+ProjectsSection = collections.namedtuple(
+    "ProjectsSection", ["start", "end", "projects"]
+)
+
 
-    listed_projects = set()
-    project_section = False
-    for _, l in enumerate(lines):
-        idx = l.find(PROJECT_KEY)
-        if idx >= 0:
-            project_section = True
-        if project_section:
-            # Find first parenthesis after the key
-            start = l.find("](")
-            if start > 0:
-                closing_parenthesis = sorted(
-                    [m.start() for m in re.finditer(r"\)", l) if m.start() > start]
-                )[0]
-                project = l[start + 2 : closing_parenthesis]
-                listed_projects.add(project)
-        # If the Projects section is over, stop iteration.
-        # It will stop before seeing ## but wainting for it
-        # Allows the user to use single # in the projects' descriptions
-        if len(listed_projects) > 0 and l.startswith("#"):
-            return listed_projects
-    return listed_projects
+def parse_projects_section(lines):
+    """Parse the Projects section of an index.md file in a single pass.
+    The section starts at the line containing conf.PROJECT_KEY and ends at
+    the first title after its first project, so that descriptions may use
+    single #. Projects are the section's lines with a markdown link, their
+    descriptions may wrap on the indented lines that follow:
+        * [Name](/link) - description
+          more description
+
+    Args:
+        lines (list(str)): the index.md file's lines
+
+    Returns:
+        ProjectsSection: the section, with start None if there is none
+    """
+    start = None
+    projects = []
+    # Whether the previous lines belong to the last project
+    in_project = False
+    for i, line in enumerate(lines):
+        if start is None:
+            if PROJECT_KEY in line:
+                start = i
+            continue
+        if projects and line.startswith("#"):
+            return ProjectsSection(start, i, projects)
+        if not line.strip():
+            continue
+        if in_project and line[0] in " \t":
+            project = projects[-1]
+            description = " ".join([project.description, line.strip()]).strip()
+            projects[-1] = project._replace(description=description, end=i + 1)
+            continue
+        in_project = False
+        link_start = line.find("](")
+        if link_start <= 0:
+            continue
+        link_end = line.find(")", link_start + 2)
+        if link_end < 0:
+            continue
+        projects.append(
+            ListedProject(
+                name=line[line.find("[") + 1 : link_start],
+                link=line[link_start + 2 : link_end],
+                description=line[link_end + 1 :].strip().lstrip("-").strip(),
+                start=i,
+                end=i + 1,
+            )
+        )
+        in_project = True
+    return ProjectsSection(start, len(lines), projects)
+
+
+class RouteTable:
+    """Routes from url prefixes to directories, stored as a trie of path
+    segments: finding a path's route only costs as many lookups as the path
+    has segments, whatever the number of routes. The longest matching prefix
+    wins, and prefixes only match whole segments (/proj does not match
+    /proj_v2).
+
+    Args:
+        routes (list(list)): list of routes, one route being:
+            [pattern to look for, absolute location]
+    """
+
+    def __init__(self, routes):
+        self.routes = sorted(routes)
+        self.trie = {}
+        for key, location in self.routes:
+            node = self.trie
+            for segment in key.strip("/").split("/"):
+                node = node.setdefault(segment, {})
+            node[None] = (key, location)
+
+    def match(self, path):
+        """Find the route of a url path
+
+        Args:
+            path (str): the requested path, possibly with a query string
+
+        Returns:
+            tuple(str, str): the matched pattern and its location, or
+                (None, None) if no route matches
+        """
+        match = (None, None)
+        node = self.trie
+        for segment in path.split("?")[0].split("#")[0].strip("/").split("/"):
+            node = node.get(segment)
+            if node is None:
+                break
+            match = node.get(None, match)
+        return match
+
+
+# Routes of the served projects, shared by serve's request handlers
+_ROUTE_TABLE = RouteTable([])
 
 
 def set_routes():
-    """Set the METADOCS_ROUTES environment variable with a serialized list
-    of list of routes, one route being:
+    """Update the route table with the projects listed in the Home
+    Documentation, if they changed. The METADOCS_ROUTES environment variable
+    is set with a serialized list of list of routes, one route being:
         [pattern to look for, absolute location]
     """
-    os.system("pwd")
+    global _ROUTE_TABLE
+
     dir_path = Path(os.getcwd()).absolute()
     projects = get_listed_projects()
-    routes = [
-        [p if p[0] == "/" else "/" + p, str(dir_path) + "{}/build/html".format(p)]
-        for p in projects
-    ]
-    os.environ["METADOCS_ROUTES"] = json.dumps(routes)
+    routes = []
+    for p in projects:
+        p = "/" + p.strip("/")
+        routes.append([p, str(dir_path) + "{}/build/html".format(p)])
+
+    if sorted(routes) != _ROUTE_TABLE.routes:
+        _ROUTE_TABLE = RouteTable(routes)
+        os.environ["METADOCS_ROUTES"] = json.dumps(_ROUTE_TABLE.routes)
 
 
 def get_routes():
-    """Parse routes from environment.
+    """Get the current routes
 
     Returns:
         list(list): list of routes, one route being:
             [pattern to look for, absolute location]
     """
-    return json.loads(os.getenv("METADOCS_ROUTES", "[[]]"))
+    return _ROUTE_TABLE.routes
+
+
+def get_route_table():
+    """Get the current route table
+
+    Returns:
+        RouteTable: the routes of the served projects
+    """
+    return _ROUTE_TABLE
+
+
+class RebuildQueue:
+    """Collects what the watcher's events affect and rebuilds each affected
+    target once they stopped coming for `quiet` seconds, so that an editor's
+    save or a `git checkout` only triggers one rebuild per project and one
+    of the Home Documentation.
+
+    Collected targets are then handed to a RebuildScheduler, from the
+    queue's own thread, so that events are never delayed by builds.
+
+    Args:
+        scheduler (RebuildScheduler): builds the targets
+        quiet (float, optional): Defaults to conf.DEBOUNCE. Seconds without
+            events to wait for before rebuilding
+    """
+
+    def __init__(self, scheduler, quiet=DEBOUNCE):
+        self.scheduler = scheduler
+        self.quiet = quiet
+        self.home = False
+        self.projects = set()
+        self.last_event = 0
+        self.condition = threading.Condition()
+
+        thread = threading.Thread(target=self._run)
+        thread.daemon = True
+        thread.start()
+
+    def add_home(self):
+        """The Home Documentation should be rebuilt
+        """
+        with self.condition:
+            self.home = True
+            self._notify()
+
+    def add_project(self, project):
+        """A project should be rebuilt
+
+        Args:
+            project (str): the project's name
+        """
+        with self.condition:
+            self.projects.add(project)
+            self._notify()
+
+    def _notify(self):
+        self.last_event = time.monotonic()
+        self.condition.notify()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not (self.home or self.projects):
+                    self.condition.wait()
+                # Wait for the quiet window to pass without events
+                remaining = self.quiet
+                while remaining > 0:
+                    self.condition.wait(remaining)
+                    remaining = self.last_event + self.quiet - time.monotonic()
+                home, projects = self.home, self.projects
+                self.home, self.projects = False, set()
+            # An invalid mkdocs.yml must not stop the watcher: its next save
+            # is rebuilt
+            try:
+                set_routes()
+                if home:
+                    self.scheduler.submit(HOME_TARGET)
+                for project in sorted(projects):
+                    self.scheduler.submit(project)
+            except Exception as e:
+                print(
+                    "{}Rebuilding failed:{} {}".format(colors.FAIL, colors.ENDC, e),
+                    file=sys.stderr,
+                )
+
+
+class RebuildScheduler:
+    """Runs rebuilds for serve: builds of different targets (projects or
+    the Home Documentation) run in parallel, up to `jobs` at once. A target
+    submitted again while it is being built supersedes the running build:
+    a project's build is cancelled and restarted, the Home Documentation is
+    built again once its current build is over. The search index is merged
+    again after each rebuild.
+
+    Args:
+        sphinx_daemon (SphinxDaemon): builds the projects
+        jobs (int, optional): Defaults to the number of CPUs. Maximum
+            number of builds running at once
+        history (int, optional): Defaults to 50. Number of finished
+            builds to remember
+        file_cache (FileCache, optional): Defaults to None. Cache to evict
+            a target's built files from once it is rebuilt
+        metrics (ServerMetrics, optional): Defaults to None. Where the
+            rebuilds' durations are reported
+
+    Attributes:
+        scanned (threading.Event): set once serve submitted the targets
+            that changed since their last build, until then more builds
+            may come
+    """
+
+    def __init__(
+        self, sphinx_daemon, jobs=None, history=50, file_cache=None, metrics=None
+    ):
+        self.sphinx_daemon = sphinx_daemon
+        self.file_cache = file_cache
+        self.metrics = metrics
+        self.jobs = jobs or os.cpu_count() or 1
+        self.queued = []
+        self.running = {}
+        self.finished = collections.deque(maxlen=history)
+        self.lock = threading.Lock()
+        self.search_index_lock = threading.Lock()
+        self.scanned = threading.Event()
+
+    def submit(self, target):
+        """Schedule a build, superseding the target's running build if any
+
+        Args:
+            target (str): a project's name, or HOME_TARGET
+        """
+        with self.lock:
+            if target in self.running and target != HOME_TARGET:
+                self.sphinx_daemon.cancel(target)
+            if target not in self.queued:
+                self.queued.append(target)
+            self._start_builds()
+
+    def status(self):
+        """Which builds are queued, running and finished
+
+        Returns:
+            dict: queued targets, running targets with their start time,
+                finished builds, most recent first, and whether the initial
+                scan for stale targets is done
+        """
+        with self.lock:
+            return {
+                "scanned": self.scanned.is_set(),
+                "queued": list(self.queued),
+                "running": [
+                    {"target": t, "started": started}
+                    for t, started in self.running.items()
+                ],
+                "finished": list(self.finished),
+            }
+
+    def _start_builds(self):
+        for target in list(self.queued):
+            if len(self.running) >= self.jobs:
+                break
+            # Wait for the superseded build to be over
+            if target in self.running:
+                continue
+            self.queued.remove(target)
+            self.running[target] = time.time()
+            thread = threading.Thread(target=self._build, args=(target,))
+            thread.daemon = True
+            thread.start()
+
+    def _build(self, target):
+        start = time.monotonic()
+        status = 1
+        try:
+            status, err = self._run_build(target)
+            print(err, end="", file=sys.stderr)
+            if status:
+                print(
+                    "{}Building {} failed with exit status {}{}".format(
+                        colors.FAIL, target, status, colors.ENDC
+                    )
+                )
+        except Exception as e:
+            # E.g. an invalid mkdocs.yml: a failed build, the next change is
+            # rebuilt
+            print(
+                "{}Building {} failed:{} {!r}".format(
+                    colors.FAIL, target, colors.ENDC, e
+                ),
+                file=sys.stderr,
+            )
+        finally:
+            duration = time.monotonic() - start
+            if self.metrics is not None:
+                if status is None:
+                    result = "cancelled"
+                else:
+                    result = "failure" if status else "success"
+                self.metrics.observe_rebuild(target, result, duration)
+
+            with self.lock:
+                started = self.running.pop(target)
+                self.finished.appendleft(
+                    {
+                        "target": target,
+                        "status": "cancelled" if status is None else status,
+                        "started": started,
+                        "duration": duration,
+                    }
+                )
+                self._start_builds()
+
+    def _run_build(self, target):
+        """Build a target, then update the search index and the file cache
+
+        Args:
+            target (str): a project's name, or HOME_TARGET
+
+        Returns:
+            tuple(int, str): the build's exit status, None if it was
+                cancelled, and the errors it printed
+        """
+        dir_path = self.sphinx_daemon.dir_path
+        if target == HOME_TARGET:
+            status = 0 if build_home_documentation() else 1
+            err = ""
+            if json.loads(os.getenv("METADOCS_OFFLINE", "false")):
+                make_offline()
+            compress_directory(get_mkdocs_config()["site_dir"])
+        else:
+            status, _, err = self.sphinx_daemon.build(target)
+
+        search_path = (dir_path / get_site_dir(dir_path) / SEARCH_INDEX).parent
+        with self.search_index_lock:
+            try:
+                write_search_index(dir_path)
+                compress_directory(search_path)
+            except (OSError, ValueError) as e:
+                print("Could not update the search index: {}".format(e))
+
+        if self.file_cache is not None:
+            if target == HOME_TARGET:
+                self.file_cache.evict(get_mkdocs_config(dir_path)["site_dir"])
+            else:
+                self.file_cache.evict(dir_path / target / "build")
+                self.file_cache.evict(search_path)
+        return status, err
+
+
+def get_stale_targets(dir_path, site_dir, docs_dir, offline=False):
+    """Find the targets whose last build is out of date, for serve to
+    rebuild them in the background while it serves the last builds
+
+    Args:
+        dir_path (pathlib.Path): the Home Documentation's path
+        site_dir (pathlib.Path): mkdocs's built site
+        docs_dir (pathlib.Path): mkdocs's sources
+        offline (bool, optional): Defaults to False. Whether the Home
+            Documentation should be rebuilt for offline use anyway
+
+    Returns:
+        list(str): HOME_TARGET if the Home Documentation changed since it
+            was built, then the listed projects whose inputs changed
+    """
+    targets = []
+    try:
+        built = (site_dir / "index.html").stat().st_mtime
+    except OSError:
+        built = None
+    sources = [dir_path / "mkdocs.yml"]
+    for root, _, filenames in os.walk(str(docs_dir)):
+        sources += [Path(root) / f for f in filenames]
+    if offline or built is None or any(p.stat().st_mtime > built for p in sources):
+        targets.append(HOME_TARGET)
+
+    manifest = load_build_manifest(dir_path)
+    for project in sorted(p.strip("/") for p in get_listed_projects(dir_path)):
+        project_path = dir_path / project
+        if not (project_path / "source").is_dir():
+            continue
+        mode = get_build_mode(
+            manifest.get(project),
+            hash_project_inputs(project_path),
+            project_path / HTML_LOCATION,
+        )
+        if mode != "skip":
+            targets.append(project)
+    return targets
 
 
-class MetadocsFileHandler(PatternMatchingEventHandler):
+def get_ignore_patterns(dir_path):
+    """Patterns of paths the watcher should ignore: mkdocs's site_dir,
+    the projects' build directories and what .gitignore lists
+
+    Args:
+        dir_path (pathlib.Path): the Home Documentation's path
+
+    Returns:
+        list(str): fnmatch patterns. Patterns starting with "/" match paths
+            relative to dir_path, others match any path component
+    """
+    site_dir = get_site_dir(dir_path)
+
+    patterns = ["/" + site_dir.strip("/"), "/*/" + HTML_LOCATION.split("/")[0]]
+    patterns += [".*", "__pycache__"]
+
+    gitignore = dir_path / ".gitignore"
+    if gitignore.exists():
+        with open(gitignore, "r") as f:
+            for l in f:
+                l = l.strip()
+                # Negations are not supported, ignoring less is safe
+                if l and not l.startswith(("#", "!")):
+                    patterns.append(l.rstrip("/"))
+    return patterns
+
+
+def is_ignored(relative_path, patterns):
+    """Whether a path matches one of the watcher's ignore patterns
+
+    Args:
+        relative_path (str): path relative to the Home Documentation
+        patterns (list(str)): from get_ignore_patterns
+
+    Returns:
+        bool: True if the path should be ignored
+    """
+    parts = relative_path.strip("/").split("/")
+    for pattern in patterns:
+        if pattern.startswith("/") or "/" in pattern:
+            pattern = pattern.lstrip("/")
+            depth = pattern.count("/") + 1
+            if fnmatch.fnmatch("/".join(parts[:depth]), pattern):
+                return True
+        elif any(fnmatch.fnmatch(part, pattern) for part in parts):
+            return True
+    return False
+
+
+def get_watched_inputs(dir_path, packages=False):
+    """The paths the watcher should subscribe to: the Home Documentation's
+    directory itself (not recursively, for mkdocs.yml), its docs_dir and
+    each project's source/. Optionally, the directories next to source/,
+    holding the documented code autodoc reads.
+
+    Args:
+        dir_path (pathlib.Path): the Home Documentation's path
+        packages (bool, optional): Defaults to False. Whether to also watch
+            the documented packages
+
+    Returns:
+        list(tuple(pathlib.Path, bool)): paths to watch and whether to watch
+            them recursively
+    """
+    docs_dir = get_docs_dir(dir_path)
+
+    patterns = get_ignore_patterns(dir_path)
+    inputs = [(dir_path, False), (dir_path / docs_dir, True)]
+    for project_path in sorted(dir_path.iterdir()):
+        if not (project_path / "source").is_dir():
+            continue
+        inputs.append((project_path / "source", True))
+        if packages:
+            inputs += [
+                (p, True)
+                for p in sorted(project_path.iterdir())
+                if p.is_dir()
+                and p.name != "source"
+                and not is_ignored(str(p.relative_to(dir_path)), patterns)
+            ]
+    return inputs
+
+
+class MetadocsFileHandler:
     """Class handling file changes:
         .md: The Home Documentation has been modified
-            -> mkdocs build
+            -> build the Home Documentation
         .rst: A project's sphinx documentation has been modified
-            -> metadocs build -F -p {project}
+            -> the project is rebuilt by the sphinx daemon
+        .py: A documented package has been modified (if watched)
+            -> the project is rebuilt by the sphinx daemon
+    Rebuilds are queued, not run from the observer's thread.
+
+    Handlers are scheduled on a watchdog observer, which only needs their
+    dispatch method: they don't subclass watchdog's handlers so that
+    watchdog is only imported by serve.
+
+    Args:
+        rebuild_queue (RebuildQueue): collects the targets to rebuild
+        dir_path (pathlib.Path): the Home Documentation's path
+        packages (bool, optional): Defaults to False. Whether to watch
+            the documented packages too
+        patterns (list(str), optional): Defaults to None. fnmatch patterns
+            of the files whose changes to handle, all files if None
     """
 
+    def __init__(self, rebuild_queue, dir_path, packages=False, patterns=None):
+        self.rebuild_queue = rebuild_queue
+        self.dir_path = Path(dir_path).resolve()
+        self.packages = packages
+        self.patterns = patterns
+        self.ignore_rules = get_ignore_patterns(self.dir_path)
+        self.observer = None
+        self.watched = set()
+
+    def watch(self, observer):
+        """Schedule this handler on the Home Documentation's inputs.
+        Called again when the Home Documentation changes, to watch
+        projects added since.
+
+        Args:
+            observer (watchdog.observers.Observer): the observer to use
+        """
+        self.observer = observer
+        for path, recursive in get_watched_inputs(self.dir_path, self.packages):
+            if path not in self.watched and path.is_dir():
+                observer.schedule(self, str(path), recursive=recursive)
+                self.watched.add(path)
+
+    def dispatch(self, event):
+        """Handle an event from the observer, if it is about a file matching
+        the patterns
+
+        Args:
+            event (watchdog.events.FileSystemEvent): the event
+        """
+        if self.patterns is not None:
+            paths = [event.src_path, getattr(event, "dest_path", None) or ""]
+            names = [os.path.basename(p) for p in paths if p]
+            if not any(fnmatch.fnmatch(n, p) for n in names for p in self.patterns):
+                return
+        self.on_any_event(event)
+
     def on_any_event(self, event):
-        set_routes()
+        # Files being opened or closed (by the builds themselves) don't matter
+        if event.event_type not in {"created", "modified", "moved", "deleted"}:
+            return
 
-        offline = ""
-        if event.src_path.split(".")[-1] in {"md", "yml", "yaml"}:
-            try:
-                _ = subprocess.check_output("mkdocs build > /dev/null", shell=True)
-            except subprocess.CalledProcessError as e:
-                print(e, "\n")
-            if json.loads(os.getenv("METADOCS_OFFLINE", "false")):
-                make_offline()
+        paths = [event.src_path]
+        if getattr(event, "dest_path", None):
+            paths.append(event.dest_path)
 
-        if event.src_path.split(".")[-1] == "rst":
+        for path in paths:
             # src_path:
             # /Users/you/Documents/YourDocs/example_project/source/index.md
-            # os.getcwd():
+            # dir_path:
             # /Users/you/Documents/YourDocs
             # relative_path:
             # /example_project/docs/index.md
             # project: example_project
+            relative_path = path.split(str(self.dir_path))[-1]
+            if is_ignored(relative_path, self.ignore_rules):
+                continue
+
+            if path.split(".")[-1] in {"md", "yml", "yaml"}:
+                self.rebuild_queue.add_home()
+                if self.observer is not None:
+                    # An invalid mkdocs.yml must not stop the observer: keep
+                    # the current watches until it is fixed
+                    try:
+                        self.watch(self.observer)
+                    except Exception as e:
+                        print(
+                            "{}Watching new inputs failed:{} {}".format(
+                                colors.FAIL, colors.ENDC, e
+                            ),
+                            file=sys.stderr,
+                        )
 
-            relative_path = event.src_path.split(os.getcwd())[-1]
-            project = relative_path.split("/")[1]
-            if json.loads(os.getenv("METADOCS_OFFLINE", "false")):
-                offline = "--offline"
-            os.system("metadocs build -F {} -p {} > /dev/null".format(offline, project))
+            if path.split(".")[-1] in {"rst", "py"}:
+                project = relative_path.split("/")[1]
+                if (self.dir_path / project / "source").is_dir():
+                    self.rebuild_queue.add_project(project)
 
 
-def make_offline():
+def make_offline(dir_path=None):
     """Deletes references to the external google fonts in the Home
     Documentation's index.html file
+
+    Args:
+        dir_path (pathlib.Path, optional): Defaults to the current
+            directory. The Home Documentation's path
     """
-    dir_path = Path(os.getcwd()).absolute()
+    dir_path = dir_path or Path(os.getcwd()).absolute()
 
-    yaml = YAML()
-    mkdocs_yml = yaml.load(open(dir_path / 'mkdocs.yml'))
-    site_dir = mkdocs_yml['site_dir'] if 'site_dir' in mkdocs_yml else 'site'
+    site_dir = get_site_dir(dir_path)
 
     css_path = dir_path / site_dir / "assets" / "stylesheets"
     material_css = css_path / "material-style.css"
@@ -326,44 +2098,36 @@ def add_project_to_rst_index(index_path, project_name):
 
 
 def add_project_to_doc_index(index_path, project_name):
+    """List a project in the Projects section of the Home Documentation's
+    index.md file, after the other projects, unless it is already listed
 
+    Args:
+        index_path (pathlib.Path): the index.md file
+        project_name (str): the project's name
+    """
     with open(index_path, "r") as index_file:
         lines = index_file.readlines()
 
-    new_lines = []
-    project_strings = []
-    project_section = False
-    for _, l in enumerate(lines):
-        idx = l.find(PROJECT_KEY)
-
-        if idx >= 0:
-            project_section = True
-            new_lines.append(l)
-            continue
+    section = parse_projects_section(lines)
+    if section.start is None:
+        return
+    if any(p.link.strip("/") == project_name for p in section.projects):
+        return
 
-        if project_section:
-            if "#" in l:
-                project_section = False
-                project_exists = False
-                for p in project_strings:
-                    if "(/{})".format(project_name) in p:
-                        project_exists = True
-                if not project_exists:
-                    project_strings.append(
-                        "* [{}](/{}/) - [Project Desctiption to write]".format(
-                            " ".join([w.capitalize() for w in project_name.split("_")]),
-                            project_name,
-                        )
-                    )
-                    l = "\n".join(project_strings) + "\n\n" + l
-            else:
-                if "*" in l and "](" in l:
-                    project_strings.append(l.replace("\n", ""))
-                    l = ""
+    project_string = "* [{}](/{}/) - [Project Desctiption to write]\n".format(
+        " ".join([w.capitalize() for w in project_name.split("_")]), project_name
+    )
+    if section.projects:
+        position = section.projects[-1].end
+        if not lines[position - 1].endswith("\n"):
+            lines[position - 1] += "\n"
+    else:
+        position = section.start + 1
+        project_string = "\n" + project_string
+    lines.insert(position, project_string)
 
-        new_lines.append(l)
     with open(index_path, "w") as f:
-        f.write("".join([l for l in new_lines if l]))
+        f.write("".join(lines))
 
 
 def remove_project_name_from_titles(source_path):
@@ -28,4 +28,7 @@ setup(name='metadocs',
           'pexpect',
           'pygments'
       ],
+      extras_require={
+          'brotli': ['brotli'],
+      },
       )
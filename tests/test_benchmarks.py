@@ -0,0 +1,17 @@
+"""Benchmark harness: metadocs.benchmarks"""
+
+from metadocs import benchmarks
+
+
+def test_wait_for_builds_waits_for_initial_scan(monkeypatch):
+    statuses = [
+        # Serving, stale targets not submitted yet
+        {"scanned": False, "queued": [], "running": [], "finished": []},
+        {"scanned": True, "queued": ["proj"], "running": [], "finished": []},
+        {"scanned": True, "queued": [], "running": [{"target": "proj"}]},
+        {"scanned": True, "queued": [], "running": [], "finished": []},
+    ]
+    monkeypatch.setattr(benchmarks, "get_builds", lambda url: statuses.pop(0))
+    monkeypatch.setattr(benchmarks.time, "sleep", lambda seconds: None)
+    assert benchmarks.wait_for_builds("http://127.0.0.1:1") is None
+    assert not statuses
@@ -0,0 +1,36 @@
+"""Build stages' measures: BuildProfiler"""
+
+import pytest
+
+from metadocs import utils
+
+
+@pytest.fixture
+def resets(monkeypatch):
+    resets = []
+    monkeypatch.setattr(utils, "reset_peak_rss", lambda: resets.append(1))
+    return resets
+
+
+def test_peak_rss_untouched_when_not_measured(resets):
+    profiler = utils.BuildProfiler()
+    with profiler.stage("outer"):
+        with profiler.stage("inner"):
+            pass
+    assert not resets
+    assert [s["peak_rss"] for s in profiler.stages] == [None, None]
+    assert all(s["wall"] >= 0 and s["cpu"] >= 0 for s in profiler.stages)
+
+
+def test_peak_rss_measured(resets, monkeypatch):
+    peaks = iter([100, 300, 200, 250, 400, 500])
+    monkeypatch.setattr(utils, "get_peak_rss", lambda: next(peaks))
+    profiler = utils.BuildProfiler(peak_rss=True)
+    with profiler.stage("outer"):
+        with profiler.stage("inner"):
+            pass
+    assert len(resets) == 2
+    inner, outer = profiler.stages
+    # The outer stage keeps the peak reached before the inner one reset it
+    assert (inner["stage"], inner["peak_rss"]) == ("inner", 400)
+    assert (outer["stage"], outer["peak_rss"]) == ("outer", 500)
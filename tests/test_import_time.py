@@ -0,0 +1,79 @@
+"""Import time regression checks: commands only import what they need,
+measured with python -X importtime"""
+
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+SCRIPT = ROOT / "bin" / "metadocs"
+
+# Modules only serve, build and the other heavy commands need
+HEAVY_MODULES = {
+    "metadocs.commands",
+    "metadocs.utils",
+    "metadocs.server",
+    "http.server",
+    "socketserver",
+    "multiprocessing",
+    "concurrent.futures",
+    "cProfile",
+    "sphinx",
+    "mkdocs",
+    "watchdog",
+}
+
+# Microseconds metadocs's own imports may take for light commands, ~1ms
+# today, while importing metadocs.commands takes ~75ms
+IMPORT_BUDGET = 20000
+
+
+def get_imported_modules(*arguments):
+    """Modules imported by running metadocs's CLI, from -X importtime's report
+
+    Returns:
+        dict: cumulative import time in microseconds of each module, and
+            the modules imported by no other module (the top level ones)
+    """
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", str(SCRIPT)] + list(arguments),
+        cwd=str(ROOT),
+        env={"PYTHONPATH": str(ROOT)},
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    )
+    modules = {}
+    top_level = set()
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            modules[name.strip()] = int(cumulative)
+            # Nested imports are indented under the module importing them
+            if not name[1:].startswith(" "):
+                top_level.add(name.strip())
+    return modules, top_level
+
+
+@pytest.mark.parametrize("arguments", [["version", "--version"], ["--help"]])
+def test_light_commands_skip_heavy_imports(arguments):
+    modules, _ = get_imported_modules(*arguments)
+    assert "metadocs" in modules
+    assert not HEAVY_MODULES & set(modules)
+
+
+@pytest.mark.parametrize("arguments", [["version", "--version"], ["--help"]])
+def test_light_commands_import_budget(arguments):
+    modules, top_level = get_imported_modules(*arguments)
+    # Everything metadocs's modules imported is included in their times
+    import_time = sum(
+        modules[name]
+        for name in top_level
+        if name == "metadocs" or name.startswith("metadocs.")
+    )
+    assert 0 < import_time < IMPORT_BUDGET
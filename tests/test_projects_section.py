@@ -0,0 +1,79 @@
+"""index.md's Projects section: parse_projects_section and
+add_project_to_doc_index"""
+
+from metadocs import utils
+
+INDEX = """Home
+
+# Projects
+
+* [A](/a/) - first
+* [B](/b/) - second
+  more of b
+
+    and its second paragraph
+
+# Customization
+
+Something
+"""
+
+
+def add_project(tmp_path, text, project_name):
+    index_path = tmp_path / "index.md"
+    index_path.write_text(text)
+    utils.add_project_to_doc_index(index_path, project_name)
+    return index_path.read_text()
+
+
+def test_parse_projects_section():
+    lines = INDEX.splitlines(True)
+    section = utils.parse_projects_section(lines)
+    assert (section.start, section.end) == (2, 10)
+    a, b = section.projects
+    assert a == utils.ListedProject("A", "/a/", "first", 4, 5)
+    assert b == utils.ListedProject(
+        "B", "/b/", "second more of b and its second paragraph", 5, 9
+    )
+    assert lines[b.end - 1] == "    and its second paragraph\n"
+
+
+def test_parse_projects_section_without_section():
+    section = utils.parse_projects_section(["Home\n", "# Other\n"])
+    assert section.start is None
+    assert section.projects == []
+
+
+def test_add_project_after_wrapped_description(tmp_path):
+    text = add_project(tmp_path, INDEX, "my_project")
+    assert text == INDEX.replace(
+        "    and its second paragraph\n",
+        "    and its second paragraph\n"
+        "* [My Project](/my_project/) - [Project Desctiption to write]\n",
+    )
+    projects = utils.parse_projects_section(text.splitlines(True)).projects
+    assert [p.description for p in projects] == [
+        "first",
+        "second more of b and its second paragraph",
+        "[Project Desctiption to write]",
+    ]
+
+
+def test_add_project_to_empty_section(tmp_path):
+    text = add_project(tmp_path, "Home\n\n# Projects\n", "proj")
+    assert text == (
+        "Home\n\n# Projects\n\n"
+        "* [Proj](/proj/) - [Project Desctiption to write]\n"
+    )
+
+
+def test_add_project_without_final_newline(tmp_path):
+    text = add_project(tmp_path, "# Projects\n\n* [A](/a/) - a\n  more", "b")
+    assert text == (
+        "# Projects\n\n* [A](/a/) - a\n  more\n"
+        "* [B](/b/) - [Project Desctiption to write]\n"
+    )
+
+
+def test_add_existing_project(tmp_path):
+    assert add_project(tmp_path, INDEX, "b") == INDEX
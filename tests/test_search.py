@@ -0,0 +1,159 @@
+"""Merged search index: SearchIndexWriter, write_search_index and
+SearchIndex.search"""
+
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from metadocs import utils
+from metadocs.conf import SEARCH_INDEX, SEARCH_PARTIAL, SEARCH_WEIGHTS
+
+SPHINX_INDEX = {
+    "docnames": ["index", "usage"],
+    "titles": ["Welcome to models", "Usage"],
+    # Sphinx stores terms stemmed
+    "terms": {"model": [0, 1], "document": 0, "happi": 1},
+    "titleterms": {"usag": 1},
+    "alltitles": {"Modeling details": [[1, "modeling-details"]]},
+    "objects": {"pkg": [[0, 0, 1, "", "Modeler"]]},
+    "objnames": {"0": ["py", "class", "Python class"]},
+}
+
+MKDOCS_INDEX = {
+    "docs": [
+        {"location": "", "title": "Home", "text": "All the documentation"},
+        {"location": "#projects", "title": "Projects", "text": "Models here"},
+    ]
+}
+
+
+def make_index():
+    writer = utils.SearchIndexWriter()
+    writer.add_mkdocs_site(MKDOCS_INDEX)
+    writer.add_sphinx_project("proj", SPHINX_INDEX)
+    return utils.SearchIndex(writer.to_dict())
+
+
+def urls(results):
+    return [result["url"] for result in results]
+
+
+def pages(results):
+    return sorted(result["url"].partition("#")[0] for result in results)
+
+
+def test_writer_stems_words_and_keeps_object_names():
+    index = make_index()
+    assert "model" in index.terms
+    assert "models" not in index.terms
+    assert "pkg.modeler" in index.terms
+    # Words of the Home Documentation and of section titles are stemmed
+    assert "document" in index.terms
+    assert "documentation" not in index.terms
+
+
+def test_writer_weights():
+    writer = utils.SearchIndexWriter()
+    writer.add_sphinx_project("proj", SPHINX_INDEX)
+    index = writer.to_dict()
+    assert index["version"] == 2
+    assert index["projects"] == ["proj"]
+    assert index["pages"] == [
+        [0, "/proj/index.html", "Welcome to models"],
+        [0, "/proj/usage.html", "Usage"],
+    ]
+    page, anchor, weight = index["terms"]["usag"]
+    assert (page, index["anchors"][anchor]) == (1, "")
+    assert weight == SEARCH_WEIGHTS["title"]
+    page, anchor, weight = index["terms"]["pkg.modeler"]
+    assert (page, index["anchors"][anchor]) == (0, "pkg.Modeler")
+    assert weight == SEARCH_WEIGHTS["object"]
+
+
+@pytest.mark.parametrize(
+    "query, expected",
+    [
+        ("model", ["/", "/proj/index.html", "/proj/usage.html"]),
+        ("models", ["/", "/proj/index.html", "/proj/usage.html"]),
+        ("documentation", ["/", "/proj/index.html"]),
+        ("usage", ["/proj/usage.html"]),
+        ("happiness", ["/proj/usage.html"]),
+    ],
+)
+def test_search_stemmed_matches(query, expected):
+    assert pages(make_index().search(query)) == sorted(expected)
+
+
+def test_search_prefix_hits():
+    index = make_index()
+    results = index.search("mod")
+    assert "/proj/index.html#pkg.Modeler" in urls(results)
+    # Only a prefix of the terms: partial weight
+    usage = [r for r in results if r["url"].startswith("/proj/usage.html")]
+    assert usage[0]["score"] == SEARCH_WEIGHTS["section"] * SEARCH_PARTIAL
+    assert usage[0]["url"] == "/proj/usage.html#modeling-details"
+
+
+def test_search_all_words():
+    index = make_index()
+    assert urls(index.search("models usage")) == ["/proj/usage.html"]
+    assert index.search("models nothing") == []
+
+
+@pytest.mark.parametrize("query", ["", "  ", "<b></b>"])
+def test_search_empty_query(query):
+    assert make_index().search(query) == []
+
+
+def test_search_limit():
+    assert len(make_index().search("model", limit=1)) == 1
+
+
+def test_concurrent_stems_and_searches():
+    words = ["happiness", "organization", "documentation", "models", "usage"]
+    expected = {word: utils.stem(word) for word in words}
+    index = make_index()
+    expected_results = {word: index.search(word) for word in words}
+
+    def check(i):
+        word = words[i % len(words)]
+        for _ in range(200):
+            assert utils.stem(word) == expected[word]
+        assert index.search(word) == expected_results[word]
+
+    with ThreadPoolExecutor(16) as executor:
+        list(executor.map(check, range(160)))
+
+
+def test_write_search_index(tmp_path):
+    (tmp_path / "mkdocs.yml").write_text("site_name: Home\n")
+    (tmp_path / "docs").mkdir()
+    (tmp_path / "docs" / "index.md").write_text(
+        "# Projects\n\n* [Proj](/proj/) - a project\n"
+    )
+    (tmp_path / "site" / "search").mkdir(parents=True)
+    (tmp_path / "site" / "search" / "search_index.json").write_text(
+        json.dumps(MKDOCS_INDEX)
+    )
+    html_path = tmp_path / "proj" / "build" / "html"
+    html_path.mkdir(parents=True)
+    (html_path / "searchindex.js").write_text(
+        "Search.setIndex({});".format(json.dumps(SPHINX_INDEX))
+    )
+    # Not listed: not indexed
+    other_path = tmp_path / "other" / "build" / "html"
+    other_path.mkdir(parents=True)
+    (other_path / "searchindex.js").write_text(
+        "Search.setIndex({});".format(json.dumps(SPHINX_INDEX))
+    )
+
+    index_path = utils.write_search_index(tmp_path)
+    assert index_path == tmp_path / "site" / SEARCH_INDEX
+    index = utils.SearchIndex.load(tmp_path)
+    assert index.projects == [utils.HOME_TARGET, "proj"]
+    assert pages(index.search("models")) == [
+        "/",
+        "/proj/index.html",
+        "/proj/usage.html",
+    ]
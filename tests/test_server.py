@@ -0,0 +1,108 @@
+"""serve's responses: metadocs.server"""
+
+import http.client
+import os
+import threading
+
+import pytest
+
+from metadocs import server
+
+
+@pytest.fixture
+def async_server(tmp_path):
+    class Handler(server.CachingHTTPRequestHandler):
+        web_dir = tmp_path
+
+    httpd = server.AsyncHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.server_close()
+    thread.join(5)
+
+
+def request(httpd, path, connection=None):
+    connection = connection or http.client.HTTPConnection(
+        *httpd.server_address, timeout=5
+    )
+    connection.request("GET", path)
+    response = connection.getresponse()
+    return response, response.read()
+
+
+@pytest.mark.parametrize(
+    "accept_encoding, expected",
+    [
+        (None, None),
+        ("", None),
+        ("gzip", "gzip"),
+        ("gzip, br", "br"),
+        ("br;q=1, gzip;q=1", "br"),
+        ("gzip;q=1, br;q=0.1", "gzip"),
+        ("gzip;q=0.5, br;q=0.8", "br"),
+        ("br;q=0, gzip", "gzip"),
+        ("*", "br"),
+        ("*;q=0.5, gzip", "gzip"),
+        ("gzip;q=0, br;q=0", None),
+        ("identity;q=1, gzip;q=0.5", None),
+        ("identity;q=0.5, gzip;q=0.5", "gzip"),
+        ("GZIP ; q=0.9", "gzip"),
+    ],
+)
+def test_choose_encoding(tmp_path, accept_encoding, expected):
+    path = tmp_path / "page.html"
+    for suffix in ("", ".br", ".gz"):
+        (tmp_path / ("page.html" + suffix)).write_bytes(b"page")
+    stat = os.stat(str(path))
+    encoding, body_path, _ = server.choose_encoding(str(path), stat, accept_encoding)
+    assert encoding == expected
+    suffixes = {None: "", "br": ".br", "gzip": ".gz"}
+    assert body_path == str(path) + suffixes[expected]
+
+
+def test_choose_encoding_skips_missing_and_stale_sidecars(tmp_path):
+    path = tmp_path / "page.html"
+    path.write_bytes(b"page")
+    (tmp_path / "page.html.gz").write_bytes(b"page")
+    stat = os.stat(str(path))
+    # No .br: the next best
+    assert server.choose_encoding(str(path), stat, "br, gzip;q=0.5")[0] == "gzip"
+    os.utime(str(tmp_path / "page.html.gz"), ns=(0, stat.st_mtime_ns - 1))
+    assert server.choose_encoding(str(path), stat, "gzip")[0] is None
+
+
+def test_file_region_shorter_than_expected(tmp_path):
+    path = tmp_path / "page.html"
+    path.write_bytes(b"0123456789")
+    region = server.FileRegion(str(path), 2, 8)
+    assert region.read() == b"23456789"
+    region.close()
+    with pytest.raises(OSError):
+        server.FileRegion(str(path), 2, 9)
+
+
+@pytest.mark.parametrize("size", [None, 4])
+def test_async_file_changed_after_stat(async_server, tmp_path, monkeypatch, size):
+    path = tmp_path / "page.html"
+    (tmp_path / "other.html").write_bytes(b"other")
+    get_response = server.get_response
+
+    def changed_response(target, *args):
+        response = get_response(target, *args)
+        # A rebuild removes or shortens the file once it was stat'ed
+        if target == "/page.html":
+            if size is None:
+                path.unlink()
+            else:
+                path.write_bytes(b"x" * size)
+        return response
+
+    path.write_bytes(b"0123456789")
+    monkeypatch.setattr(server, "get_response", changed_response)
+    connection = http.client.HTTPConnection(*async_server.server_address, timeout=5)
+    response, body = request(async_server, "/page.html", connection)
+    assert response.status == 404
+    # The connection is still usable
+    response, body = request(async_server, "/other.html", connection)
+    assert (response.status, body) == (200, b"other")
@@ -0,0 +1,51 @@
+"""serve's builds: SphinxDaemon"""
+
+import os
+import threading
+import time
+
+from metadocs import utils
+
+# A build that never ends, run by a process make starts
+MAKEFILE = """clean:
+\ttrue
+
+html:
+\tsleep 60 & echo $$! > sleep.pid; wait
+"""
+
+
+def is_running(pid):
+    try:
+        with open("/proc/{}/stat".format(pid)) as f:
+            # Zombies are over, only waiting to be reaped
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+
+
+def test_cancel_stops_makefile_builds(tmp_path):
+    project_path = tmp_path / "proj"
+    (project_path / "source").mkdir(parents=True)
+    (project_path / "Makefile").write_text(MAKEFILE)
+    daemon = utils.SphinxDaemon(tmp_path)
+    results = []
+    thread = threading.Thread(target=lambda: results.append(daemon.build("proj")))
+    thread.start()
+
+    pid_path = project_path / "sleep.pid"
+    deadline = time.time() + 30
+    while not (pid_path.exists() and pid_path.read_text().strip()):
+        assert time.time() < deadline
+        time.sleep(0.05)
+    pid = int(pid_path.read_text())
+
+    daemon.cancel("proj")
+    thread.join(10)
+    assert results == [(None, "", "")]
+    deadline = time.time() + 5
+    while is_running(pid) and time.time() < deadline:
+        time.sleep(0.05)
+    if is_running(pid):
+        os.kill(pid, 9)
+        raise AssertionError("make's processes outlived the cancelled build")
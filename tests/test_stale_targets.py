@@ -0,0 +1,21 @@
+"""Targets serve rebuilds when it starts: get_stale_targets"""
+
+from metadocs import utils
+
+
+def test_stale_targets_of_another_directory(tmp_path, monkeypatch):
+    home_path = tmp_path / "home"
+    (home_path / "docs").mkdir(parents=True)
+    (home_path / "mkdocs.yml").write_text("site_name: Home\n")
+    (home_path / "docs" / "index.md").write_text(
+        "# Projects\n\n* [Proj](/proj/) - never built\n"
+    )
+    (home_path / "proj" / "source").mkdir(parents=True)
+    (home_path / "proj" / "source" / "index.rst").write_text("Proj\n====\n")
+    # Projects are found in the given directory, not the current one
+    monkeypatch.chdir(str(tmp_path))
+
+    targets = utils.get_stale_targets(
+        home_path, home_path / "site", home_path / "docs"
+    )
+    assert targets == [utils.HOME_TARGET, "proj"]